@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+bench_import
+----------------------------------
+
+Benchmarks the start-up cost of short-lived metadata jobs.
+
+Each statement is run in a fresh interpreter, and the median wall time over
+several runs is reported.
+
+    python benchmarks/bench_import.py [-n RUNS]
+"""
+
+# system imports
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'data')
+
+statements = [
+    ('interpreter', 'pass'),
+    ('import numpy', 'import numpy'),
+    ('import topas2numpy', 'import topas2numpy'),
+    ('binned metadata', 'from topas2numpy.header import read_metadata; '
+                        'read_metadata(%r)' % os.path.join(data_dir, 'Dose.bin')),
+    ('ntuple metadata', 'from topas2numpy.header import read_metadata; '
+                        'read_metadata(%r)' % os.path.join(data_dir, 'binary-phasespace.phsp')),
+    ('BinnedResult.from_header', 'from topas2numpy import BinnedResult; '
+                                 'BinnedResult.from_header(%r)' % os.path.join(data_dir, 'Dose.bin')),
+]
+
+
+def time_statement(statement, n_runs):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.join(data_dir, '..', '..'),
+                                         env.get('PYTHONPATH', '')])
+    times = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', statement], env=env)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument('-n', '--runs', type=int, default=10,
+                        help='number of runs per statement')
+    args = parser.parse_args()
+
+    for name, statement in statements:
+        t = time_statement(statement, args.runs)
+        print('%-26s %7.1f ms' % (name, 1e3 * t))
+
+
+if __name__ == '__main__':
+    main()
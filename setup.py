@@ -36,7 +36,16 @@ setup(
     package_dir={'topas2numpy':
                  'topas2numpy'},
     include_package_data=True,
+    python_requires='>=3.8',
     install_requires=requirements,
+    extras_require={
+        'zstd': ['zstandard'],
+    },
+    entry_points={
+        'console_scripts': [
+            'topas2numpy=topas2numpy.cli:main',
+        ],
+    },
     license="MIT",
     zip_safe=False,
     keywords=[
@@ -50,12 +59,11 @@ setup(
         'Intended Audience :: Science/Research',
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
-        "Programming Language :: Python :: 2",
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Topic :: Scientific/Engineering :: Medical Science Apps.',
         'Topic :: Scientific/Engineering :: Physics',
     ],
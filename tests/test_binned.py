@@ -11,9 +11,13 @@ Tests for TOPAS binned reading.
 # system imports
 import unittest
 import os.path
+import asyncio
+import shutil
+import tempfile
 
 # third-party imports
 import numpy as np
+from numpy.testing import assert_array_almost_equal
 
 # project imports
 from topas2numpy import BinnedResult
@@ -131,6 +135,137 @@ class TestBinary1D(unittest.TestCase):
         assert data.shape[2] == self.result.dimensions[2].n_bins
 
 
+class TestAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.result = BinnedResult(binary_1d_path)
+        self.dose = self.result.data['Sum']
+        self.mask = np.zeros(self.dose.shape, dtype=bool)
+        self.mask[..., 10:30] = True
+
+    def test_dvh(self):
+        edges = np.linspace(0, self.dose.max(), 11)
+        for n_threads in (None, 2):
+            _, volume = self.result.dvh(self.mask, bins=edges, cumulative=False,
+                                        chunk_size=3, n_threads=n_threads)
+            expected, _ = np.histogram(self.dose[self.mask], edges)
+            assert_array_almost_equal(volume, expected / 20.)
+
+    def test_dvh_cumulative(self):
+        edges, volume = self.result.dvh(self.mask, bins=10, chunk_size=7)
+        assert volume[0] == 1.
+        for e, v in zip(edges[:-1], volume):
+            self.assertAlmostEqual(v, np.mean(self.dose[self.mask] >= e))
+
+    def test_profile(self):
+        centers, values = self.result.profile('Z', chunk_size=5, n_threads=2)
+        assert_array_almost_equal(centers, np.arange(40) * 0.5 + 0.25)
+        assert_array_almost_equal(values, self.dose[0, 0])
+
+        centers, values = self.result.profile('X', position={'Z': 3})
+        assert_array_almost_equal(values, self.dose[:, 0, 3])
+
+    def test_percentile(self):
+        q = [5, 50, 95]
+        actual = self.result.percentile(q, mask=self.mask, chunk_size=4)
+        assert_array_almost_equal(actual, np.percentile(self.dose[self.mask], q))
+
+    def test_percentile_repeated_values(self):
+        # zeros fill most bins, so selection needs several passes
+        self.result.data['Sum'] = np.where(self.dose > np.median(self.dose), self.dose, 0)
+        q = [0, 25, 60, 90, 100]
+        actual = self.result.percentile(q, chunk_size=2)
+        assert_array_almost_equal(actual, np.percentile(self.result.data['Sum'], q))
+
+    def test_mmap(self):
+        result = BinnedResult(binary_1d_path, mmap_mode='r')
+        assert isinstance(result.data['Sum'], np.memmap)
+        assert_array_almost_equal(result.data['Sum'], self.dose)
+
+
+class TestDerivedStatistics(unittest.TestCase):
+    def setUp(self):
+        self.result = BinnedResult(binary_1d_path)
+        data = self.result.data
+        n = data['Histories_with_Scorer_Active']
+        self.mean = np.where(n > 0, data['Sum'] / np.maximum(n, 1), 0)
+        self.se = np.where(n > 0, data['Standard_Deviation'] / np.sqrt(np.maximum(n, 1)), 0)
+
+    def test_derive(self):
+        derived = self.result.derive_statistics(chunk_size=7, n_threads=2)
+        assert_array_almost_equal(derived['Mean_Per_History'], self.mean)
+        assert_array_almost_equal(derived['Standard_Error'], self.se)
+        rel = np.where(self.mean != 0, self.se / np.where(self.mean != 0, self.mean, 1), 0)
+        assert_array_almost_equal(derived['Relative_Uncertainty'], rel)
+
+    def test_out(self):
+        out = np.full(self.mean.shape, -1.)
+        derived = self.result.derive_statistics('Mean_Per_History',
+                                                out={'Mean_Per_History': out})
+        assert derived['Mean_Per_History'] is out
+        assert_array_almost_equal(out, self.mean)
+
+    def test_out_not_in_names(self):
+        out = np.full(self.mean.shape, -1.)
+        with self.assertRaises(ValueError):
+            self.result.derive_statistics(['Standard_Error'],
+                                          out={'Relative_Uncertainty': out})
+        assert (out == -1).all()
+
+    def test_variance_source(self):
+        del self.result.data['Standard_Deviation']
+        derived = self.result.derive_statistics(['Standard_Error'])
+        assert_array_almost_equal(derived['Standard_Error'], self.se)
+
+    def test_standard_deviation_without_histories(self):
+        expected = self.result.data['Standard_Deviation']
+        del self.result.data['Histories_with_Scorer_Active']
+        derived = self.result.derive_statistics(['Standard_Deviation'])
+        assert_array_almost_equal(derived['Standard_Deviation'], expected)
+
+    def test_missing_statistics(self):
+        result = BinnedResult(ascii_1d_path)
+        with self.assertRaises(KeyError):
+            result.derive_statistics()
+
+
+class TestAsyncLoad(unittest.TestCase):
+    def test_aload(self):
+        async def load_all():
+            paths = [ascii_1d_path, ascii_2d_path, binary_1d_path]
+            return await asyncio.gather(*map(BinnedResult.aload, paths))
+        results = asyncio.run(load_all())
+        assert results[2].quantity == 'DoseToMedium'
+        assert_array_almost_equal(results[0].data['Sum'],
+                                  BinnedResult(ascii_1d_path).data['Sum'])
+
+
+class TestBinaryValidation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        shutil.copy(binary_1d_path + 'header', self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'Dose.bin')
+        self.expected = BinnedResult(binary_1d_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_truncated(self):
+        with open(binary_1d_path, 'rb') as f_in, open(self.path, 'wb') as f_out:
+            f_out.write(f_in.read()[:-8])
+        with self.assertRaises(IOError):
+            BinnedResult(self.path)
+        with self.assertRaises(IOError):
+            BinnedResult(self.path, mmap_mode='r')
+
+    def test_byteorder(self):
+        values = np.fromfile(binary_1d_path, dtype='<f8')
+        values.astype('>f8').tofile(self.path)
+        result = BinnedResult(self.path, byteorder='>')
+        assert result.data['Sum'].dtype == np.dtype('>f8')
+        for stat in result.statistics:
+            assert_array_almost_equal(result.data[stat], self.expected.data[stat])
+
+
 if __name__ == '__main__':
     import sys
     sys.exit(unittest.main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_catalog
+----------------------------------
+
+Tests for the metadata catalog of TOPAS results.
+"""
+
+# system imports
+import unittest
+from unittest import mock
+import os
+import gzip
+import shutil
+import tempfile
+
+# project imports
+from topas2numpy import BinnedResult
+from topas2numpy import catalog
+from topas2numpy.catalog import Catalog, scan, scan_file
+
+
+data_dir = 'tests/data'
+
+
+class TestScan(unittest.TestCase):
+    def test_binned(self):
+        record = scan_file(os.path.join(data_dir, 'Dose.bin'))
+        assert record['kind'] == 'binned'
+        assert record['format'] == 'binary'
+        assert record['quantity'] == 'DoseToMedium'
+        assert record['n_records'] == 40
+        assert record['dimensions'][2] == {'name': 'Z', 'unit': 'cm', 'n_bins': 40, 'bin_width': 0.5}
+
+    def test_ntuple(self):
+        record = scan_file(os.path.join(data_dir, 'limited-phasespace.phsp'))
+        assert record['kind'] == 'ntuple'
+        assert record['format'] == 'binary'
+        assert record['n_records'] == 104
+        assert record['columns'][0] == 'Particle Type (sign from z direction)'
+
+    def test_from_header(self):
+        result = BinnedResult.from_header(os.path.join(data_dir, 'Dose.csv'))
+        assert result.data is None
+        assert result.statistics == ['Sum']
+
+    def test_scan(self):
+        records = scan(data_dir, n_threads=4)
+        paths = sorted(os.path.basename(r['path']) for r in records)
+        assert paths == [
+            'Dose.bin', 'Dose.csv', 'SurfaceTracks.csv',
+            'ascii-other-ntuple.phsp', 'ascii-phasespace.phsp',
+            'binary-other-ntuple.phsp', 'binary-phasespace.phsp',
+            'limited-phasespace.phsp',
+        ]
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp_dir, 'results')
+        shutil.copytree(data_dir, self.root)
+        self.catalog = Catalog(os.path.join(self.tmp_dir, 'catalog.db'))
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_query(self):
+        assert self.catalog.refresh(self.root) == (8, 0)
+
+        records = self.catalog.query(dimension='Z', bin_width=0.1)
+        assert [os.path.basename(r['path']) for r in records] == ['Dose.csv']
+        assert records[0]['dimensions'][2]['n_bins'] == 300
+
+        records = self.catalog.query(kind='binned', statistic='Standard_Deviation')
+        assert [r['quantity'] for r in records] == ['DoseToMedium']
+
+        records = self.catalog.query(column='Wavelength [nm]')
+        assert len(records) == 2
+        assert records[0]['n_records'] == 1587
+
+    def test_incremental(self):
+        self.catalog.refresh(self.root)
+        assert self.catalog.refresh(self.root) == (0, 0)
+
+        dose_path = os.path.join(self.root, 'Dose.csv')
+        stat = os.stat(dose_path)
+        os.utime(dose_path, (stat.st_atime, stat.st_mtime + 10))
+        os.remove(os.path.join(self.root, 'SurfaceTracks.csv'))
+        assert self.catalog.refresh(self.root) == (1, 1)
+        assert len(self.catalog.query(kind='binned')) == 2
+
+    def test_compressed_copy(self):
+        header_path = os.path.join(self.root, 'Dose.binheader')
+        with open(header_path, 'rb') as f_in, gzip.open(header_path + '.gz', 'wb') as f_out:
+            f_out.write(f_in.read())
+        assert self.catalog.refresh(self.root) == (8, 0)
+
+    def test_rejected(self):
+        notes_path = os.path.join(self.root, 'notes.csv')
+        with open(notes_path, 'w') as f:
+            f.write('# not a TOPAS result\n1, 2, 3\n')
+        assert self.catalog.refresh(self.root) == (8, 0)
+
+        # unchanged files that failed to parse are not read again
+        with mock.patch.object(catalog, 'scan_file', wraps=scan_file) as mock_scan:
+            assert self.catalog.refresh(self.root) == (0, 0)
+            assert mock_scan.call_count == 0
+
+            stat = os.stat(notes_path)
+            os.utime(notes_path, (stat.st_atime, stat.st_mtime + 10))
+            assert self.catalog.refresh(self.root) == (0, 0)
+            assert mock_scan.call_count == 1
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
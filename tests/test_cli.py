@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cli
+----------------------------------
+
+Tests for the topas2numpy command-line tool.
+"""
+
+# system imports
+import unittest
+import os.path
+import io
+import json
+import shutil
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+
+# third-party imports
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# project imports
+from topas2numpy import BinnedResult, read_ntuple
+from topas2numpy.cli import main
+
+
+data_dir = 'tests/data'
+binary_1d_path = os.path.join(data_dir, 'Dose.bin')
+binary_path = os.path.join(data_dir, 'binary-phasespace.phsp')
+ascii_path = os.path.join(data_dir, 'ascii-phasespace.phsp')
+
+
+def run(*argv, stderr=None):
+    stdout = io.StringIO()
+    with redirect_stdout(stdout), redirect_stderr(stderr or io.StringIO()):
+        status = main(list(argv))
+    return status, stdout.getvalue()
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_ntuple(self, name, n_records, data=''):
+        """Writes an ASCII ntuple whose header states n_records."""
+        with open(ascii_path.replace('.phsp', '.header')) as f:
+            header = f.read()
+        stem = os.path.join(self.tmp_dir, name)
+        with open(stem + '.header', 'w') as f:
+            f.write(header.replace('Scored Particles: 104',
+                                   'Scored Particles: %d' % n_records))
+        with open(stem + '.phsp', 'w') as f:
+            f.write(data)
+        return stem + '.phsp'
+
+    def test_info(self):
+        status, output = run('info', '--json', binary_1d_path, binary_path)
+        assert status == 0
+        records = [json.loads(line) for line in output.splitlines()]
+        assert records[0]['quantity'] == 'DoseToMedium'
+        assert records[0]['dimensions'][2]['n_bins'] == 40
+        assert records[1]['n_records'] == 104
+
+    def test_info_missing(self):
+        status, output = run('info', binary_1d_path, os.path.join(data_dir, 'missing.bin'))
+        assert status == 1
+        assert output.startswith(binary_1d_path)
+
+    def test_convert(self):
+        status, _ = run('convert', '-j', '2', '-o', self.tmp_dir, binary_1d_path, ascii_path)
+        assert status == 0
+        expected = BinnedResult(binary_1d_path).data['Sum']
+        assert_array_equal(np.load(os.path.join(self.tmp_dir, 'Dose.npy')), expected)
+        assert_array_equal(np.load(os.path.join(self.tmp_dir, 'ascii-phasespace.npy')),
+                           read_ntuple(ascii_path))
+
+    def test_convert_error(self):
+        stderr = io.StringIO()
+        missing = os.path.join(data_dir, 'missing.bin')
+        status, _ = run('convert', '-o', self.tmp_dir, missing, stderr=stderr)
+        assert status == 1
+        assert stderr.getvalue().startswith('topas2numpy: %s: ' % missing)
+
+    def test_convert_npz(self):
+        status, _ = run('convert', '-f', 'npz', '-o', self.tmp_dir, binary_path)
+        assert status == 0
+        expected = read_ntuple(binary_path)
+        with np.load(os.path.join(self.tmp_dir, 'binary-phasespace.npz')) as converted:
+            assert sorted(converted.files) == sorted(expected.dtype.names)
+            assert_array_equal(converted['Energy (MeV)'], expected['Energy (MeV)'])
+        assert os.listdir(self.tmp_dir) == ['binary-phasespace.npz']
+
+    def test_convert_columns(self):
+        status, _ = run('convert', '-f', 'columns', '-o', self.tmp_dir, binary_path)
+        assert status == 0
+        expected = read_ntuple(binary_path)
+        column_dir = os.path.join(self.tmp_dir, 'binary-phasespace')
+        assert_array_equal(np.load(os.path.join(column_dir, 'Weight.npy')), expected['Weight'])
+
+    def test_convert_record_count(self):
+        with open(ascii_path) as f:
+            data = f.read()
+        for n_records in (103, 105):
+            path = self.write_ntuple('wrong-count-%d' % n_records, n_records, data)
+            status, _ = run('convert', path)
+            assert status == 1
+            assert not os.path.exists(path.replace('.phsp', '.npy'))
+
+            output = os.path.join(self.tmp_dir, 'merged.npy')
+            status, _ = run('merge', '-o', output, ascii_path, path)
+            assert status == 1
+            assert not os.path.exists(output)
+
+    def test_merge_binned(self):
+        output = os.path.join(self.tmp_dir, 'merged.npz')
+        status, _ = run('merge', '-o', output, binary_1d_path, binary_1d_path)
+        assert status == 0
+        expected = BinnedResult(binary_1d_path).data
+        with np.load(output) as merged:
+            assert_array_equal(merged['Sum'], 2 * expected['Sum'])
+            assert_array_equal(merged['Max'], expected['Max'])
+            assert 'Mean' not in merged
+
+    def test_merge_ntuple(self):
+        output = os.path.join(self.tmp_dir, 'merged.npy')
+        status, _ = run('merge', '-o', output, binary_path, binary_path)
+        assert status == 0
+        expected = read_ntuple(binary_path)
+        assert_array_equal(np.load(output), np.concatenate([expected, expected]))
+
+    def test_merge_empty(self):
+        empty_path = self.write_ntuple('empty', 0)
+        output = os.path.join(self.tmp_dir, 'merged.npy')
+        status, _ = run('merge', '-o', output, empty_path, empty_path)
+        assert status == 1
+        assert not os.path.exists(output)
+
+    def test_stats_empty(self):
+        empty_path = self.write_ntuple('empty', 0)
+        status, output = run('stats', empty_path)
+        assert status == 0
+        assert output.startswith(empty_path)
+        status, output = run('stats', '--json', empty_path)
+        assert json.loads(output)['statistics']['Weight']['count'] == 0
+
+    def test_stats(self):
+        status, output = run('stats', '--json', '--chunk-size', '7', binary_path)
+        assert status == 0
+        summary = json.loads(output)['statistics']['Energy (MeV)']
+        energy = read_ntuple(binary_path)['Energy (MeV)'].astype(float)
+        assert summary['count'] == 104
+        self.assertAlmostEqual(summary['mean'], energy.mean(), places=4)
+        self.assertAlmostEqual(summary['std'], energy.std(), places=4)
+        self.assertAlmostEqual(summary['max'], energy.max(), places=4)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_compression
+----------------------------------
+
+Tests for reading compressed TOPAS results.
+"""
+
+# system imports
+import unittest
+import os.path
+import shutil
+import tempfile
+import gzip
+import lzma
+import zlib
+import struct
+
+# third-party imports
+import numpy as np
+from numpy.testing import assert_array_equal
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# project imports
+from topas2numpy import BinnedResult, read_ntuple, iter_ntuple
+from topas2numpy._compression import read_file_into
+from topas2numpy.ntuple import _read_unsized
+
+
+data_dir = 'tests/data'
+
+
+def write_bgzf(path, data, block_size=1000):
+    """Writes data as BGZF, i.e. gzip members with their sizes in the header."""
+    with open(path, 'wb') as f:
+        for start in range(0, len(data), block_size):
+            block = data[start:start+block_size]
+            c = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+            deflated = c.compress(block) + c.flush()
+            header = b'\x1f\x8b\x08\x04' + b'\x00' * 4 + b'\x00\xff'
+            header += struct.pack('<HBBHH', 6, 66, 67, 2, 18 + len(deflated) + 8 - 1)
+            footer = struct.pack('<II', zlib.crc32(block) & 0xffffffff, len(block))
+            f.write(header + deflated + footer)
+
+
+def zstd_open(path, mode):
+    """Opens a file for writing zstd-compressed data."""
+    return zstandard.ZstdCompressor().stream_writer(open(path, mode))
+
+
+class CompressedFiles(object):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def compress(self, filename, opener):
+        src = os.path.join(data_dir, filename)
+        dst = os.path.join(self.tmp_dir, filename)
+        if opener is None:
+            shutil.copy(src, dst)
+            return dst
+        ext = {gzip.open: '.gz', lzma.open: '.xz', zstd_open: '.zst'}[opener]
+        with open(src, 'rb') as f_in, opener(dst + ext, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        return dst + ext
+
+
+class TestCompressedBinned(CompressedFiles, unittest.TestCase):
+    def test_binary(self):
+        expected = BinnedResult(os.path.join(data_dir, 'Dose.bin'))
+        for opener in (gzip.open, lzma.open):
+            path = self.compress('Dose.bin', opener)
+            self.compress('Dose.binheader', opener)
+            result = BinnedResult(path)
+            assert result.statistics == expected.statistics
+            for stat in result.statistics:
+                assert_array_equal(result.data[stat], expected.data[stat])
+
+    def test_uncompressed_header(self):
+        path = self.compress('Dose.bin', gzip.open)
+        self.compress('Dose.binheader', None)
+        assert BinnedResult(path).quantity == 'DoseToMedium'
+
+    def test_ascii(self):
+        path = self.compress('SurfaceTracks.csv', gzip.open)
+        result = BinnedResult(path, dtype=np.uint32)
+        expected = BinnedResult(os.path.join(data_dir, 'SurfaceTracks.csv'), dtype=np.uint32)
+        assert_array_equal(result.data['Sum'], expected.data['Sum'])
+
+    def test_truncated(self):
+        src = os.path.join(data_dir, 'Dose.bin')
+        with open(src, 'rb') as f_in, gzip.open(os.path.join(self.tmp_dir, 'Dose.bin.gz'), 'wb') as f_out:
+            f_out.write(f_in.read()[:-8])
+        self.compress('Dose.binheader', None)
+        with self.assertRaises(IOError):
+            BinnedResult(os.path.join(self.tmp_dir, 'Dose.bin.gz'))
+
+    def test_trailing_data(self):
+        src = os.path.join(data_dir, 'Dose.bin')
+        with open(src, 'rb') as f_in, gzip.open(os.path.join(self.tmp_dir, 'Dose.bin.gz'), 'wb') as f_out:
+            f_out.write(f_in.read() + b'\x00' * 800)
+        self.compress('Dose.binheader', None)
+        with self.assertRaises(IOError):
+            BinnedResult(os.path.join(self.tmp_dir, 'Dose.bin.gz'))
+
+
+class TestCompressedNtuple(CompressedFiles, unittest.TestCase):
+    def test_read(self):
+        for name in ('ascii-phasespace', 'binary-phasespace', 'limited-phasespace'):
+            expected = read_ntuple(os.path.join(data_dir, name + '.phsp'))
+            for opener in (gzip.open, lzma.open):
+                path = self.compress(name + '.phsp', opener)
+                self.compress(name + '.header', opener)
+                assert_array_equal(read_ntuple(path), expected)
+                chunks = list(iter_ntuple(path, chunk_size=30))
+                assert_array_equal(np.concatenate(chunks), expected)
+
+
+@unittest.skipIf(zstandard is None, 'requires zstandard')
+class TestZstd(CompressedFiles, unittest.TestCase):
+    def test_binned(self):
+        expected = BinnedResult(os.path.join(data_dir, 'Dose.bin'))
+        path = self.compress('Dose.bin', zstd_open)
+        self.compress('Dose.binheader', zstd_open)
+        result = BinnedResult(path)
+        for stat in result.statistics:
+            assert_array_equal(result.data[stat], expected.data[stat])
+
+        path = self.compress('SurfaceTracks.csv', zstd_open)
+        expected = BinnedResult(os.path.join(data_dir, 'SurfaceTracks.csv'))
+        assert_array_equal(BinnedResult(path).data['Sum'], expected.data['Sum'])
+
+    def test_ntuple(self):
+        for name in ('ascii-phasespace', 'binary-phasespace'):
+            expected = read_ntuple(os.path.join(data_dir, name + '.phsp'))
+            path = self.compress(name + '.phsp', zstd_open)
+            self.compress(name + '.header', None)
+            assert_array_equal(read_ntuple(path), expected)
+            chunks = list(iter_ntuple(path, chunk_size=30))
+            assert_array_equal(np.concatenate(chunks), expected)
+
+
+class TestUncountedNtuple(CompressedFiles, unittest.TestCase):
+    def setUp(self):
+        super(TestUncountedNtuple, self).setUp()
+        # header without the number of records
+        with open(os.path.join(data_dir, 'binary-phasespace.header')) as f:
+            header = f.read().replace('Number of Scored Particles: 104', '')
+        with open(os.path.join(self.tmp_dir, 'binary-phasespace.header'), 'w') as f:
+            f.write(header)
+        self.expected = read_ntuple(os.path.join(data_dir, 'binary-phasespace.phsp'))
+
+    def test_read(self):
+        path = self.compress('binary-phasespace.phsp', gzip.open)
+        assert_array_equal(read_ntuple(path), self.expected)
+        assert_array_equal(_read_unsized(path, self.expected.dtype, chunk_size=7), self.expected)
+
+    def test_empty(self):
+        path = os.path.join(self.tmp_dir, 'binary-phasespace.phsp.gz')
+        with gzip.open(path, 'wb'):
+            pass
+        data = read_ntuple(path)
+        assert data.size == 0
+        assert data.dtype == self.expected.dtype
+
+
+class TestBgzf(CompressedFiles, unittest.TestCase):
+    def test_parallel(self):
+        data = np.arange(10000, dtype=np.float64)
+        path = os.path.join(self.tmp_dir, 'data.bgz')
+        write_bgzf(path, data.tobytes())
+
+        out = np.empty_like(data)
+        assert read_file_into(path, out, n_threads=4) == data.nbytes
+        assert_array_equal(out, data)
+
+        # partial reads stop within a block
+        out = np.empty(1234, dtype=data.dtype)
+        assert read_file_into(path, out) == out.nbytes
+        assert_array_equal(out, data[:1234])
+        with self.assertRaises(IOError):
+            read_file_into(path, out, exact=True)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
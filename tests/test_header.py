@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_header
+----------------------------------
+
+Tests for NumPy-free reading of TOPAS headers.
+"""
+
+# system imports
+import unittest
+import os.path
+import subprocess
+import sys
+
+# project imports
+from topas2numpy import BinnedResult, read_ntuple
+from topas2numpy.header import read_metadata, validate
+
+
+data_dir = 'tests/data'
+
+
+class TestReadMetadata(unittest.TestCase):
+    def test_binned(self):
+        for name in ('Dose.bin', 'Dose.csv', 'SurfaceTracks.csv'):
+            path = os.path.join(data_dir, name)
+            metadata = read_metadata(path)
+            result = BinnedResult(path)
+            assert metadata['kind'] == 'binned'
+            assert metadata['quantity'] == result.quantity
+            assert metadata['unit'] == result.unit
+            assert metadata['statistics'] == result.statistics
+            assert metadata['dimensions'] == result.dimensions
+            assert metadata['n_records'] == result.data['Sum'].size
+
+    def test_ntuple(self):
+        for name in ('ascii-phasespace', 'binary-phasespace', 'limited-phasespace',
+                     'ascii-other-ntuple', 'binary-other-ntuple'):
+            path = os.path.join(data_dir, name + '.phsp')
+            metadata = read_metadata(path)
+            result = read_ntuple(path)
+            assert metadata['kind'] == 'ntuple'
+            assert tuple(metadata['columns']) == result.dtype.names
+            assert metadata['n_records'] == result.size
+            if metadata['format'] == 'binary':
+                assert metadata['itemsize'] == result.dtype.itemsize
+
+    def test_validate(self):
+        for name in ('Dose.bin', 'Dose.csv', 'binary-phasespace.phsp',
+                     'limited-phasespace.phsp', 'binary-other-ntuple.phsp'):
+            validate(os.path.join(data_dir, name))
+        with self.assertRaises(IOError):
+            validate(os.path.join(data_dir, 'Dose.bin'), value_size=4)
+
+    def test_no_numpy(self):
+        code = ('import sys, topas2numpy; '
+                'from topas2numpy.header import read_metadata; '
+                'read_metadata(%r); '
+                'assert "numpy" not in sys.modules' % os.path.join(data_dir, 'Dose.bin'))
+        subprocess.check_call([sys.executable, '-c', code])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
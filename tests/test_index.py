@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_index
+----------------------------------
+
+Tests for line indexes of ASCII files.
+"""
+
+# system imports
+import unittest
+import os
+import shutil
+import tempfile
+import warnings
+
+# third-party imports
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# project imports
+from topas2numpy import BinnedResult, read_ntuple
+from topas2numpy.index import build_index, load_index, INDEX_SUFFIX
+
+
+data_dir = 'tests/data'
+
+
+class TestLineIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        for name in ('Dose.csv', 'ascii-phasespace.phsp', 'ascii-phasespace.header',
+                     'binary-phasespace.phsp', 'binary-phasespace.header'):
+            shutil.copy(os.path.join(data_dir, name), self.tmp_dir)
+        self.csv_path = os.path.join(self.tmp_dir, 'Dose.csv')
+        self.ascii_path = os.path.join(self.tmp_dir, 'ascii-phasespace.phsp')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_build(self):
+        index = build_index(self.csv_path)
+        assert index.n_records == 300
+        assert index.read_lines(0, 1) == ['0, 0, 0, 8.45737773147448e-08']
+        assert len(index.read_lines(298)) == 2
+
+    def test_sidecar(self):
+        index = load_index(self.ascii_path)
+        assert index.n_records == 104
+        assert os.path.exists(self.ascii_path + INDEX_SUFFIX)
+
+        reloaded = load_index(self.ascii_path, build=False)
+        assert_array_equal(reloaded.starts, index.starts)
+
+        stat = os.stat(self.ascii_path)
+        os.utime(self.ascii_path, (stat.st_atime, stat.st_mtime + 10))
+        assert load_index(self.ascii_path, build=False) is None
+
+    def test_unreadable_sidecar(self):
+        index_path = self.ascii_path + INDEX_SUFFIX
+        load_index(self.ascii_path)
+        with open(index_path, 'rb') as f:
+            content = f.read()
+        expected = read_ntuple(self.ascii_path)[:5]
+        for partial in (b'', content[:len(content) // 2]):
+            with open(index_path, 'wb') as f:
+                f.write(partial)
+            assert load_index(self.ascii_path, build=False) is None
+            assert_array_equal(read_ntuple(self.ascii_path, 0, 5), expected)
+            assert load_index(self.ascii_path, build=False).n_records == 104
+        assert not [name for name in os.listdir(self.tmp_dir) if name.endswith('.tmp')]
+
+    def test_split(self):
+        index = build_index(self.ascii_path)
+        ranges = index.split(4)
+        assert len(ranges) == 4
+        assert ranges[0][0] == 0 and ranges[-1][1] == 104
+        for (_, stop), (start, _) in zip(ranges[:-1], ranges[1:]):
+            assert stop == start
+
+    def test_read_ntuple_subset(self):
+        for name in ('ascii-phasespace.phsp', 'binary-phasespace.phsp'):
+            path = os.path.join(self.tmp_dir, name)
+            expected = read_ntuple(path)
+            assert_array_equal(read_ntuple(path, 10, 20), expected[10:20])
+            assert_array_equal(read_ntuple(path, 100), expected[100:])
+            assert_array_equal(read_ntuple(path, stop=1), expected[:1])
+
+    def test_read_ntuple_past_end(self):
+        for name in ('ascii-phasespace.phsp', 'binary-phasespace.phsp'):
+            path = os.path.join(self.tmp_dir, name)
+            expected = read_ntuple(path)
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                data = read_ntuple(path, 200, 300)
+            assert data.size == 0
+            assert data.dtype == expected.dtype
+
+    def test_parallel_binned(self):
+        expected = BinnedResult(self.csv_path)
+        result = BinnedResult(self.csv_path, n_threads=3)
+        assert result.quantity == expected.quantity
+        assert result.dimensions == expected.dimensions
+        assert_array_equal(result.data['Sum'], expected.data['Sum'])
+        assert result.data['Sum'].dtype == np.float64
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
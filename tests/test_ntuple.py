@@ -11,14 +11,17 @@ Tests for TOPAS ntuple reading.
 # system imports
 import unittest
 import os.path
+import asyncio
+import shutil
+import tempfile
 
 # third-party imports
 import numpy as np
-from numpy.testing import assert_array_almost_equal
+from numpy.testing import assert_array_almost_equal, assert_array_equal
 from numpy.lib.recfunctions import append_fields
 
 # project imports
-from topas2numpy import read_ntuple
+from topas2numpy import read_ntuple, iter_ntuple, async_read_ntuple, aiter_ntuple
 
 
 data_dir = 'tests/data'
@@ -136,6 +139,74 @@ class TestBinaryOtherNtuple(unittest.TestCase, CommonOtherTests):
         self.result = read_ntuple(binary_other_path)
 
 
+class TestIterNtuple(unittest.TestCase):
+    def test_chunks(self):
+        for path in (ascii_path, binary_path, limited_path):
+            expected = read_ntuple(path)
+            chunks = list(iter_ntuple(path, chunk_size=25))
+            self.assertEqual([len(c) for c in chunks], [25, 25, 25, 25, 4])
+            assert_array_equal(np.concatenate(chunks), expected)
+
+    def test_single_record_chunks(self):
+        chunks = list(iter_ntuple(ascii_path, chunk_size=1))
+        self.assertEqual(len(chunks), 104)
+        self.assertEqual(chunks[0].dtype.names, column_names)
+
+
+class TestAsyncNtuple(unittest.TestCase):
+    def test_read(self):
+        async def read_all():
+            return await asyncio.gather(*[async_read_ntuple(p)
+                                          for p in (ascii_path, binary_path)])
+        results = asyncio.run(read_all())
+        assert_array_equal(results[1], read_ntuple(binary_path))
+
+    def test_iter(self):
+        async def read_chunks():
+            chunks = []
+            async for chunk in aiter_ntuple(binary_path, chunk_size=10, max_pending=1):
+                await asyncio.sleep(0.001)
+                chunks.append(chunk)
+            return chunks
+        chunks = asyncio.run(read_chunks())
+        assert_array_equal(np.concatenate(chunks), read_ntuple(binary_path))
+
+    def test_iter_early_exit(self):
+        async def read_first():
+            chunks = aiter_ntuple(ascii_path, chunk_size=10)
+            async for chunk in chunks:
+                await chunks.aclose()
+                return chunk
+        self.assertEqual(len(asyncio.run(read_first())), 10)
+
+
+class TestBinaryValidation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        shutil.copy(binary_path[:-5] + '.header', self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'binary-phasespace.phsp')
+        self.expected = read_ntuple(binary_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_truncated(self):
+        with open(binary_path, 'rb') as f_in, open(self.path, 'wb') as f_out:
+            f_out.write(f_in.read()[:-34])
+        with self.assertRaises(IOError):
+            read_ntuple(self.path)
+        with self.assertRaises(IOError):
+            next(iter_ntuple(self.path))
+
+    def test_byteorder(self):
+        swapped = self.expected.astype(self.expected.dtype.newbyteorder('>'))
+        swapped.tofile(self.path)
+        result = read_ntuple(self.path, byteorder='>')
+        assert result.dtype.fields['Weight'][0] == np.dtype('>f4')
+        for col in column_names:
+            assert_array_equal(result[col], self.expected[col])
+
+
 if __name__ == '__main__':
     import sys
     sys.exit(unittest.main())
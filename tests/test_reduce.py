@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_reduce
+----------------------------------
+
+Tests for parallel reductions over TOPAS ntuples.
+"""
+
+# system imports
+import unittest
+import os.path
+import operator
+import shutil
+import tempfile
+import gzip
+
+# third-party imports
+import numpy as np
+
+# project imports
+from topas2numpy import read_ntuple
+from topas2numpy.reduce import map_reduce
+
+
+data_dir = 'tests/data'
+energy = 'Energy (MeV)'
+particle = 'Particle Type (in PDG Format)'
+
+
+def energy_moments(chunk):
+    e = chunk[energy].astype(float)
+    return np.array([e.size, e.sum(), (e**2).sum()])
+
+
+def particle_counts(chunk):
+    types, counts = np.unique(chunk[particle], return_counts=True)
+    return dict(zip(types.tolist(), counts.tolist()))
+
+
+def merge_counts(a, b):
+    merged = dict(a)
+    for k, v in b.items():
+        merged[k] = merged.get(k, 0) + v
+    return merged
+
+
+class TestMapReduce(unittest.TestCase):
+    def setUp(self):
+        self.expected = read_ntuple(os.path.join(data_dir, 'binary-phasespace.phsp'))
+        e = self.expected[energy].astype(float)
+        self.moments = [e.size, e.sum(), (e**2).sum()]
+
+    def test_binary(self):
+        path = os.path.join(data_dir, 'binary-phasespace.phsp')
+        result = map_reduce(path, energy_moments, operator.add, n_workers=2, chunk_size=30)
+        np.testing.assert_allclose(result, self.moments, rtol=1e-6)
+
+    def test_ascii(self):
+        path = os.path.join(data_dir, 'ascii-phasespace.phsp')
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for ext in ('.phsp', '.header'):
+                shutil.copy(path[:-5] + ext, tmp_dir)
+            path = os.path.join(tmp_dir, 'ascii-phasespace.phsp')
+            result = map_reduce(path, particle_counts, merge_counts, n_workers=2, chunk_size=25)
+        finally:
+            shutil.rmtree(tmp_dir)
+        assert result == {11: 4, 2212: 100}
+
+    def test_serial_and_compressed(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            src = os.path.join(data_dir, 'binary-phasespace')
+            shutil.copy(src + '.header', tmp_dir)
+            path = os.path.join(tmp_dir, 'binary-phasespace.phsp.gz')
+            with open(src + '.phsp', 'rb') as f_in, gzip.open(path, 'wb') as f_out:
+                f_out.write(f_in.read())
+            result = map_reduce(path, energy_moments, operator.add, chunk_size=50)
+        finally:
+            shutil.rmtree(tmp_dir)
+        np.testing.assert_allclose(result, self.moments, rtol=1e-6)
+
+        path = os.path.join(data_dir, 'binary-phasespace.phsp')
+        result = map_reduce(path, energy_moments, operator.add, n_workers=1)
+        np.testing.assert_allclose(result, self.moments, rtol=1e-6)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_shared
+----------------------------------
+
+Tests for publishing results into shared memory.
+"""
+
+# system imports
+import unittest
+import os.path
+import multiprocessing
+
+# third-party imports
+from numpy.testing import assert_array_equal
+
+# project imports
+from topas2numpy import BinnedResult, read_ntuple
+from topas2numpy.shared import publish, attach
+
+
+data_dir = 'tests/data'
+binary_1d_path = os.path.join(data_dir, 'Dose.bin')
+binary_ntuple_path = os.path.join(data_dir, 'binary-phasespace.phsp')
+
+
+def _sum_in_child(name):
+    with attach(name) as shared:
+        return float(shared.result.data['Sum'].sum())
+
+
+class TestSharedBinned(unittest.TestCase):
+    def setUp(self):
+        self.original = BinnedResult(binary_1d_path)
+        self.shared = publish(self.original)
+
+    def tearDown(self):
+        self.shared.close()
+        self.shared.unlink()
+
+    def test_attach(self):
+        with attach(self.shared.name) as attached:
+            result = attached.result
+            assert result.quantity == self.original.quantity
+            assert result.unit == self.original.unit
+            assert result.statistics == self.original.statistics
+            assert result.dimensions == self.original.dimensions
+            for stat in self.original.statistics:
+                assert_array_equal(result.data[stat], self.original.data[stat])
+                assert not result.data[stat].flags.writeable
+            del result
+
+    def test_close_with_views(self):
+        attached = attach(self.shared.name)
+        dose = attached.result.data['Sum'][1:]
+        with self.assertRaises(BufferError):
+            attached.close()
+        assert_array_equal(attached.result.data['Sum'], self.original.data['Sum'])
+        del dose
+        attached.close()
+        assert attached.result is None
+
+        # a result held elsewhere is kept by a failed close
+        attached = attach(self.shared.name)
+        result = attached.result
+        with self.assertRaises(BufferError):
+            attached.close()
+        assert attached.result is result
+        del result
+        attached.close()
+
+    def test_attach_from_process(self):
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(2) as pool:
+            sums = pool.map(_sum_in_child, [self.shared.name] * 2)
+        expected = self.original.data['Sum'].sum()
+        assert sums == [expected, expected]
+
+
+class TestSharedNtuple(unittest.TestCase):
+    def test_attach(self):
+        original = read_ntuple(binary_ntuple_path)
+        with publish(original) as shared:
+            with attach(shared.name) as attached:
+                assert attached.result.dtype == original.dtype
+                assert_array_equal(attached.result, original)
+            shared.unlink()
+
+    def test_invalid(self):
+        with self.assertRaises(TypeError):
+            publish([1, 2, 3])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
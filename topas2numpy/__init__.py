@@ -1,7 +1,32 @@
 # -*- coding: utf-8 -*-
 
-from .binned import BinnedResult
-from .ntuple import read_ntuple
+# NOTE: public names are imported on first access, so that importing the
+# package (e.g. to use the NumPy-free topas2numpy.header) does not import NumPy
 
 __author__ = 'David Hall'
 __version__ = '0.2.0'
+
+_lazy_imports = {
+    'BinnedResult': 'binned',
+    'read_ntuple': 'ntuple',
+    'iter_ntuple': 'ntuple',
+    'async_read_ntuple': 'ntuple',
+    'aiter_ntuple': 'ntuple',
+    'read_metadata': 'header',
+}
+
+__all__ = list(_lazy_imports)
+
+
+def __getattr__(name):
+    if name not in _lazy_imports:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    import importlib
+    module = importlib.import_module('.' + _lazy_imports[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Helpers for running blocking reads without blocking an asyncio event loop."""
+
+# system imports
+import os
+import asyncio
+import functools
+import weakref
+
+
+# maximum number of blocking reads in flight per event loop
+MAX_CONCURRENCY = os.cpu_count() or 4
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore():
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphores[loop]
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs func(*args, **kwargs) in the default executor.
+
+    At most MAX_CONCURRENCY calls run at once; further calls wait their turn.
+    """
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        return await loop.run_in_executor(None, call)
+
+
+async def iterate_blocking(iterator, max_pending=2):
+    """Asynchronously yields the items of a blocking iterator.
+
+    Items are read ahead in the executor, but at most max_pending items are
+    buffered, so reading pauses while the consumer falls behind.
+    """
+    queue = asyncio.Queue(max(1, max_pending))
+    sentinel = object()
+    stopping = []
+
+    async def produce():
+        try:
+            while not stopping:
+                item = await run_blocking(next, iterator, sentinel)
+                await queue.put((True, item))
+                if item is sentinel:
+                    return
+        except Exception as e:
+            await queue.put((False, e))
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            ok, item = await queue.get()
+            if not ok:
+                raise item
+            if item is sentinel:
+                return
+            yield item
+    finally:
+        # let the producer finish its current read before closing the
+        # iterator, which cannot be closed while it is executing
+        stopping.append(True)
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait({producer}, timeout=0.01)
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
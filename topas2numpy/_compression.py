@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Transparent reading of gzip, xz and zstd compressed result files."""
+
+# system imports
+import io
+import os
+import gzip
+import lzma
+import mmap
+import zlib
+import struct
+
+
+# file extension of each supported compression format
+compression_extensions = {
+    '.gz': 'gzip',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+}
+
+# leading bytes of each supported compression format
+compression_magic = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+]
+
+# bytes decompressed per read when streaming into an array
+_read_size = 2**20
+
+
+def split_compression(path):
+    """Returns the path without its compression extension, and the format."""
+    root, ext = os.path.splitext(path)
+    if ext in compression_extensions:
+        return root, compression_extensions[ext]
+    return path, None
+
+
+def find_file(path):
+    """Returns path, or a compressed variant of path if only that exists."""
+    if os.path.exists(path):
+        return path
+    for ext in compression_extensions:
+        if os.path.exists(path + ext):
+            return path + ext
+    return path
+
+
+def sniff_compression(path):
+    """Returns the compression format of a file from its leading bytes."""
+    with open(path, 'rb') as f:
+        start = f.read(8)
+    for magic, compression in compression_magic:
+        if start.startswith(magic):
+            return compression
+    return None
+
+
+def open_file(path, mode='r'):
+    """Opens a file for reading, decompressing it transparently.
+
+    Args:
+        path: path to the (possibly compressed) file
+        mode: 'rb' for binary or 'r'/'rt' for text
+    """
+    text = 'b' not in mode
+    compression = sniff_compression(path)
+
+    if compression is None:
+        return open(path, 'r' if text else 'rb')
+    elif compression == 'gzip':
+        return gzip.open(path, 'rt' if text else 'rb')
+    elif compression == 'xz':
+        return lzma.open(path, 'rt' if text else 'rb')
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('Reading zstd-compressed files requires the zstandard package')
+    f = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    f = io.BufferedReader(f)
+    return io.TextIOWrapper(f) if text else f
+
+
+def readinto(f, buf):
+    """Reads from f until buf is full or EOF, returning the bytes read."""
+    buf = memoryview(buf).cast('B')
+    n_read = 0
+    while n_read < len(buf):
+        n = f.readinto(buf[n_read:n_read+_read_size])
+        if not n:
+            break
+        n_read += n
+    return n_read
+
+
+def read_file_into(path, buf, n_threads=None, exact=False):
+    """Decompresses a whole file into buf, returning the bytes read.
+
+    Output is decoded in chunks directly into buf, without a full-size
+    intermediate buffer. BGZF files (multi-member gzip with block sizes, as
+    written by bgzip) are decoded in parallel, one member per task.
+
+    If exact is True, raises IOError unless the decompressed file fills buf
+    exactly, i.e. it is neither truncated nor followed by further data.
+    """
+    if n_threads != 1 and sniff_compression(path) == 'gzip':
+        blocks = _bgzf_blocks(path)
+        if blocks is not None:
+            n_read, size = _read_bgzf_into(path, blocks, buf, n_threads)
+            if exact:
+                _check_exact(path, n_read, size > n_read, buf)
+            return n_read
+
+    with open_file(path, 'rb') as f:
+        n_read = readinto(f, buf)
+        if exact:
+            _check_exact(path, n_read, bool(f.read(1)), buf)
+    return n_read
+
+
+def _check_exact(path, n_read, more, buf):
+    """Raises IOError unless exactly buf was read from the file."""
+    size = memoryview(buf).nbytes
+    if n_read < size:
+        raise IOError('Truncated file: "%s"' % path)
+    if more:
+        raise IOError('File "%s" has more than the %d bytes its header implies' %
+                      (path, size))
+
+
+def _bgzf_blocks(path):
+    """Returns (offset, size, uncompressed size) of each BGZF member.
+
+    Returns None if the file is not BGZF, i.e. the member sizes cannot be
+    known without decompressing.
+    """
+    blocks = []
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = 0
+        while offset < file_size:
+            f.seek(offset)
+            header = f.read(18)
+            if len(header) < 18 or header[:4] != b'\x1f\x8b\x08\x04':
+                return None
+            xlen, = struct.unpack('<H', header[10:12])
+            extra = header[12:] + f.read(max(0, xlen - 6))
+            bsize = _bgzf_bsize(extra[:xlen])
+            if bsize is None:
+                return None
+            f.seek(offset + bsize - 4)
+            isize, = struct.unpack('<I', f.read(4))
+            blocks.append((offset, bsize, isize))
+            offset += bsize
+    return blocks
+
+
+def _bgzf_bsize(extra):
+    """Returns the block size from the 'BC' extra subfield, if present."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        si, slen = extra[pos:pos+2], struct.unpack('<H', extra[pos+2:pos+4])[0]
+        if si == b'BC' and slen == 2:
+            return struct.unpack('<H', extra[pos+4:pos+6])[0] + 1
+        pos += 4 + slen
+    return None
+
+
+def _read_bgzf_into(path, blocks, buf, n_threads):
+    """Returns the bytes read and the decompressed size of the file."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    buf = memoryview(buf).cast('B')
+    starts = [0]
+    for _, _, isize in blocks:
+        starts.append(starts[-1] + isize)
+    n_blocks = sum(1 for start in starts[1:] if start <= len(buf))
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as compressed:
+
+            def decode(i):
+                offset, bsize, _ = blocks[i]
+                member = memoryview(compressed)[offset:offset+bsize]
+                try:
+                    # zlib releases the GIL, so members decode concurrently
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    end = min(starts[i+1], len(buf))
+                    buf[starts[i]:end] = d.decompress(member, end - starts[i])
+                finally:
+                    member.release()
+
+            with ThreadPoolExecutor(n_threads) as executor:
+                list(executor.map(decode, range(n_blocks)))
+
+            # a partially filled final block
+            if n_blocks < len(blocks) and starts[n_blocks] < len(buf):
+                decode(n_blocks)
+                n_blocks += 1
+
+    return min(starts[n_blocks], len(buf)), starts[-1]
@@ -1,40 +1,31 @@
 # -*- coding: utf-8 -*-
 
 # system imports
-import re
 import os.path
+from concurrent.futures import ThreadPoolExecutor
 
 # third-party imports
 import numpy as np
 
+# project imports
+from ._compression import split_compression, find_file, open_file, read_file_into
+from .index import load_index
+from .header import BinnedDimension, parse_binned_header, read_binned_header_str, check_size
 
-class BinnedDimension(object):
-    """A dimension in which the geometry component is binned.
 
-    Attributes:
-        name  {X, Y, Z, R, Phi, Theta}
-        unit  {cm, deg}
-        n_bins
-        bin_width
-    """
-    def __init__(self, name, unit, n_bins, bin_width):
-        self.name = name
-        self.unit = unit
-        self.n_bins = n_bins
-        self.bin_width = bin_width
+# number of elements processed per chunk by the analysis methods
+DEFAULT_CHUNK_SIZE = 2**22
 
-    def get_bin_centers(self):
-        N = self.n_bins
-        w = self.bin_width
-        return np.linspace(0.5*w, (N-0.5)*w, N)
+# number of histogram bins per pass when selecting percentiles
+SELECTION_BINS = 1024
 
-    def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
-        return False
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
+# statistics that can be derived by BinnedResult.derive_statistics()
+DERIVED_STATISTICS = [
+    'Mean_Per_History',
+    'Standard_Deviation',
+    'Standard_Error',
+    'Relative_Uncertainty',
+]
 
 
 class BinnedResult(object):
@@ -46,25 +37,79 @@ class BinnedResult(object):
         statistics: list of available statistics (keys of data)
         dimensions: list of BinnedDimension objects
         data:       dict of scored data
+
+    Binary files can be memory-mapped by passing mmap_mode (see numpy.memmap),
+    so that large grids are only paged in as they are accessed.
+
+    Files compressed with gzip (.gz), xz (.xz) or zstd (.zst) are decompressed
+    while reading. The header may be compressed or not.
+
+    ASCII files can be parsed by n_threads threads, each reading a range of
+    lines found with the line index of the file (see topas2numpy.index).
+
+    The size of binary files is checked against the header before reading.
+    Binary data is read in native byte order unless byteorder is given ('<'
+    or '>'), in which case the arrays have a non-native dtype and no bytes
+    are swapped.
     """
-    def __init__(self, filepath, dtype=float):
+    def __init__(self, filepath, dtype=float, mmap_mode=None, n_threads=None,
+                 byteorder=None):
         self.path = filepath
-        _, ext = os.path.splitext(self.path)
+        base, _ = split_compression(self.path)
+        _, ext = os.path.splitext(base)
         if ext == '.bin':
-            self._read_binary(dtype)
+            if byteorder is not None:
+                dtype = np.dtype(dtype).newbyteorder(byteorder)
+            self._read_binary(dtype, mmap_mode)
         elif ext == '.csv':
-            self._read_ascii(dtype)
-
-    def _read_binary(self, dtype):
+            self._read_ascii(dtype, n_threads)
+
+    @classmethod
+    def from_header(cls, filepath):
+        """Reads only the metadata of a result file, leaving data as None.
+
+        See also topas2numpy.header.read_metadata(), which does not need NumPy.
+        """
+        result = cls.__new__(cls)
+        result.path = filepath
+        result.data = None
+        result._read_header(read_binned_header_str(filepath))
+        return result
+
+    @classmethod
+    def aload(cls, filepath, dtype=float, mmap_mode=None, n_threads=None,
+              byteorder=None):
+        """Coroutine loading a result without blocking the event loop.
+
+        e.g. results = await asyncio.gather(*map(BinnedResult.aload, paths))
+        """
+        from ._aio import run_blocking
+        return run_blocking(cls, filepath, dtype, mmap_mode, n_threads, byteorder)
+
+    def _read_binary(self, dtype, mmap_mode=None):
         """Reads data and metadata from binary format."""
         # NOTE: binary files store binned data using Fortran-like ordering.
         # Dimensions are iterated like z, y, x (so x changes fastest)
 
-        header_path = self.path + 'header'
-        with open(header_path) as f_header:
+        base, compression = split_compression(self.path)
+        header_path = find_file(base + 'header')
+        with open_file(header_path) as f_header:
             self._read_header(f_header.read())
 
-        data = np.fromfile(self.path, dtype=dtype)
+        # check the file size before reading anything
+        data_size = [len(self.statistics)] + [dim.n_bins for dim in self.dimensions]
+        n_values = int(np.prod(data_size))
+        check_size(self.path, n_values * np.dtype(dtype).itemsize)
+
+        if compression is not None:
+            if mmap_mode is not None:
+                raise ValueError('Cannot memory-map compressed file: "%s"' % self.path)
+            data = np.empty(n_values, dtype=dtype)
+            read_file_into(self.path, data, exact=True)
+        elif mmap_mode is None:
+            data = np.fromfile(self.path, dtype=dtype)
+        else:
+            data = np.memmap(self.path, dtype=dtype, mode=mmap_mode)
 
         # separate data by statistic
         data = data.reshape((len(self.statistics), -1), order='F')
@@ -76,19 +121,28 @@ class BinnedResult(object):
 
         self.data = data
 
-    def _read_ascii(self, dtype):
+    def _read_ascii(self, dtype, n_threads=None):
         """Reads data and metadata from ASCII format."""
         # NOTE: ascii files store binned data using C-like ordering.
         # Dimensions are iterated like x, y, z (so z changes fastest)
 
-        header_str = ''
-        with open(self.path) as f:
-            for line in f:
-                if line.startswith('#'):
-                    header_str += line
-        self._read_header(header_str)
-
-        data = np.loadtxt(self.path, dtype=dtype, delimiter=',', unpack=True, ndmin=1)
+        compressed = split_compression(self.path)[1] is not None
+        if n_threads is not None and n_threads > 1 and not compressed:
+            index = load_index(self.path)
+            with open(self.path) as f:
+                # header lines precede the first record
+                self._read_header(f.read(index.byte_range(0, 1)[0]))
+            data = self._read_ascii_parallel(dtype, index, n_threads)
+        else:
+            header_str = ''
+            with open_file(self.path) as f:
+                for line in f:
+                    if line.startswith('#'):
+                        header_str += line
+            self._read_header(header_str)
+
+            with open_file(self.path) as f:
+                data = np.loadtxt(f, dtype=dtype, delimiter=',', unpack=True, ndmin=1)
 
         # separate data by statistic (neglecting bin columns when necessary)
         n_dim = len(self.dimensions)
@@ -100,58 +154,443 @@ class BinnedResult(object):
 
         self.data = data
 
+    def _read_ascii_parallel(self, dtype, index, n_threads):
+        """Parses ranges of lines in parallel into a preallocated array."""
+        n_cols = len(self.dimensions) + len(self.statistics)
+        data = np.empty((n_cols, index.n_records), dtype=dtype)
+
+        def parse(record_range):
+            start, stop = record_range
+            lines = index.read_lines(start, stop)
+            data[:, start:stop] = np.loadtxt(lines, dtype=dtype, delimiter=',',
+                                             unpack=True, ndmin=2)
+
+        _map_chunks(parse, index.split(n_threads), n_threads)
+        return data
+
+    def dvh(self, mask=None, statistic='Sum', bins=100, cumulative=True,
+            chunk_size=DEFAULT_CHUNK_SIZE, n_threads=None):
+        """Computes a dose-volume histogram (DVH).
+
+        Args:
+            mask:       boolean array selecting the volume of interest
+                        (default: all bins)
+            statistic:  statistic to histogram
+            bins:       number of dose bins spanning [0, max], or bin edges
+            cumulative: if True, fraction of volume receiving at least the
+                        lower edge of each dose bin; otherwise, fraction of
+                        volume within each dose bin
+            chunk_size: number of elements processed at once
+            n_threads:  number of threads used to process chunks
+
+        Returns:
+            edges:  dose bin edges
+            volume: fraction of the volume of interest for each dose bin
+        """
+        data = self.data[statistic]
+        mask = self._check_mask(mask, data)
+        slices = list(_iter_slabs(data, chunk_size))
+
+        def chunk_values(index):
+            values = data[index]
+            if mask is not None:
+                values = values[mask[index]]
+            return values
+
+        if np.ndim(bins) == 0:
+            def chunk_max(index):
+                values = chunk_values(index)
+                return values.max() if values.size else 0
+            d_max = max(_map_chunks(chunk_max, slices, n_threads))
+            edges = np.linspace(0, d_max if d_max > 0 else 1, int(bins) + 1)
+        else:
+            edges = np.asarray(bins, dtype=float)
+
+        def chunk_hist(index):
+            values = chunk_values(index)
+            counts, _ = np.histogram(values, edges)
+            return counts, np.count_nonzero(values > edges[-1]), values.size
+
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        n_above = 0
+        n_total = 0
+        for c, a, n in _map_chunks(chunk_hist, slices, n_threads):
+            counts += c
+            n_above += a
+            n_total += n
+
+        if cumulative:
+            counts = counts[::-1].cumsum()[::-1] + n_above
+        volume = counts / float(max(n_total, 1))
+        return edges, volume
+
+    def profile(self, axis, statistic='Sum', position=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, n_threads=None):
+        """Computes a profile of a statistic along one dimension.
+
+        e.g. a depth-dose curve is result.profile('Z'), and a lateral profile
+        through the central axis is result.profile('X', position={'Y': 50}).
+
+        Args:
+            axis:       name or index of the profiled dimension
+            statistic:  statistic to profile
+            position:   dict mapping other dimensions (name or index) to the
+                        bin index at which to take the profile; dimensions
+                        not given are averaged over
+            chunk_size: number of elements processed at once
+            n_threads:  number of threads used to process chunks
+
+        Returns:
+            centers: bin centers along the profiled dimension
+            values:  profile values
+        """
+        axis = self._dimension_index(axis)
+        position = position or {}
+        index = [slice(None)] * len(self.dimensions)
+        for dim, i in position.items():
+            dim = self._dimension_index(dim)
+            if dim == axis:
+                raise ValueError('Cannot fix position along profiled axis')
+            index[dim] = i
+
+        data = self.data[statistic][tuple(index)]
+        p_axis = sum(1 for i in index[:axis] if isinstance(i, slice))
+        others = tuple(i for i in range(data.ndim) if i != p_axis)
+
+        values = np.empty(data.shape[p_axis], dtype=float)
+        slices = list(_iter_slabs(data, chunk_size, axis=p_axis))
+
+        def chunk_mean(index):
+            values[index[p_axis]] = data[index].mean(axis=others)
+
+        _map_chunks(chunk_mean, slices, n_threads)
+        return self.dimensions[axis].get_bin_centers(), values
+
+    def percentile(self, q, statistic='Sum', mask=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, n_threads=None):
+        """Computes percentiles of a statistic within a volume of interest.
+
+        e.g. D95 (the dose received by 95% of the volume) is
+        result.percentile(5, mask=mask).
+
+        Args:
+            q:          percentile or sequence of percentiles in [0, 100]
+            statistic:  statistic to evaluate
+            mask:       boolean array selecting the volume of interest
+                        (default: all bins)
+            chunk_size: number of elements processed at once
+            n_threads:  number of threads used to process chunks
+
+        Results equal numpy.percentile (linear interpolation) of the selected
+        values, but the values are never gathered into one array: each
+        percentile is narrowed down by histogramming chunks, and only the
+        values of a bin holding at most chunk_size values are gathered.
+        """
+        data = self.data[statistic]
+        mask = self._check_mask(mask, data)
+        slices = list(_iter_slabs(data, chunk_size))
+
+        q = np.asarray(q, dtype=float)
+        if np.any((q < 0) | (q > 100)):
+            raise ValueError('Percentiles must be in the range [0, 100]')
+
+        def chunk_values(index):
+            chunk = data[index]
+            if mask is not None:
+                chunk = chunk[mask[index]]
+            return chunk.ravel()
+
+        def chunk_range(index):
+            values = chunk_values(index)
+            if not values.size:
+                return 0, None, None
+            return values.size, values.min(), values.max()
+
+        ranges = [r for r in _map_chunks(chunk_range, slices, n_threads) if r[0]]
+        n = sum(r[0] for r in ranges)
+        if not n:
+            raise ValueError('No values selected')
+        lo = min(r[1] for r in ranges)
+        hi = max(r[2] for r in ranges)
+        if np.isnan(lo) or np.isnan(hi):
+            return np.full(q.shape, np.nan)
+
+        # ranks either side of each percentile, as in numpy.percentile
+        position = q / 100 * (n - 1)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, n - 1)
+        ranks = set(below.ravel()) | set(above.ravel())
+        values = _select_ranks(chunk_values, slices, ranks, lo, hi,
+                               chunk_size, n_threads)
+
+        result = np.empty(q.shape)
+        for i in np.ndindex(q.shape):
+            a = float(values[below[i]])
+            b = float(values[above[i]])
+            t = position[i] - below[i]
+            result[i] = a + (b - a) * t if t < 0.5 else b - (b - a) * (1 - t)
+        return result[()]
+
+    def derive_statistics(self, names=DERIVED_STATISTICS, out=None,
+                          n_histories=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                          n_threads=None):
+        """Computes derived statistics in a single chunked pass over data.
+
+        Only the statistics needed from data are read, and results are
+        written directly into the output arrays, so peak memory is about one
+        grid per requested output (plus one chunk of temporaries).
+
+        Derived statistics (with N the number of histories):
+            Mean_Per_History:     Sum / N
+            Standard_Deviation:   taken from Standard_Deviation, Variance or
+                                  Sum_Of_Squares (in that order of preference)
+            Standard_Error:       Standard_Deviation / sqrt(N)
+            Relative_Uncertainty: Standard_Error / Mean_Per_History
+        Bins with N = 0 (or zero mean, for Relative_Uncertainty) are set to 0.
+
+        Args:
+            names:       derived statistics to compute
+            out:         dict of preallocated output arrays, keyed by any of
+                         names; missing outputs are allocated
+            n_histories: number of histories N (default: the per-bin
+                         Histories_with_Scorer_Active statistic)
+            chunk_size:  number of elements processed at once
+            n_threads:   number of threads used to process chunks
+
+        Returns:
+            dict of derived statistics
+        """
+        if isinstance(names, str):
+            names = [names]
+        for name in names:
+            if name not in DERIVED_STATISTICS:
+                raise KeyError('Unknown derived statistic: "%s"' % name)
+        need_sd = any(n in names for n in DERIVED_STATISTICS[1:])
+        need_mean = any(n in names for n in ('Mean_Per_History', 'Relative_Uncertainty'))
+        need_se = any(n in names for n in ('Standard_Error', 'Relative_Uncertainty'))
+
+        sd_source = None
+        if need_sd:
+            for stat in ('Standard_Deviation', 'Variance', 'Sum_Of_Squares'):
+                if stat in self.data:
+                    sd_source = stat
+                    break
+            else:
+                raise KeyError('Cannot derive Standard_Deviation from: %s' %
+                               ', '.join(self.statistics))
+        if (need_mean or sd_source == 'Sum_Of_Squares') and 'Sum' not in self.data:
+            raise KeyError('Cannot derive statistics without Sum')
+
+        # N is not needed to take Standard_Deviation from the data
+        need_n = need_mean or need_se or sd_source == 'Sum_Of_Squares'
+        if need_n and n_histories is None:
+            if 'Histories_with_Scorer_Active' not in self.data:
+                raise KeyError('Number of histories required: pass n_histories '
+                               'or score Histories_with_Scorer_Active')
+            n_histories = self.data['Histories_with_Scorer_Active']
+
+        template = self.data['Sum'] if 'Sum' in self.data else self.data[sd_source]
+        out = out or {}
+        extra = [name for name in out if name not in names]
+        if extra:
+            raise ValueError('Outputs given for statistics not in names: %s' %
+                             ', '.join(extra))
+        outputs = {}
+        for name in names:
+            if name not in out:
+                outputs[name] = np.empty_like(template, dtype=float)
+            elif out[name].shape != template.shape:
+                raise ValueError('Output "%s" has shape %s, expected %s' %
+                                 (name, out[name].shape, template.shape))
+            else:
+                outputs[name] = out[name]
+
+        def chunk_derive(index):
+            if need_n:
+                n = n_histories[index] if np.ndim(n_histories) else n_histories
+                n = np.asarray(n, dtype=float)
+                has_n = n > 0
+
+            if need_mean or sd_source == 'Sum_Of_Squares':
+                total = np.asarray(self.data['Sum'][index], dtype=float)
+                mean = np.divide(total, n, out=np.zeros_like(total), where=has_n)
+                if 'Mean_Per_History' in outputs:
+                    outputs['Mean_Per_History'][index] = mean
+
+            if not need_sd:
+                return
+
+            if sd_source == 'Standard_Deviation':
+                sd = np.array(self.data[sd_source][index], dtype=float)
+            elif sd_source == 'Variance':
+                sd = np.sqrt(self.data[sd_source][index], dtype=float)
+            else:
+                # unbiased estimate: (sum(x^2) - N*mean^2) / (N-1)
+                sd = np.asarray(self.data[sd_source][index], dtype=float)
+                sd = sd - total * mean
+                np.divide(sd, n - 1, out=sd, where=n > 1)
+                sd[~(n > 1)] = 0
+                np.sqrt(np.maximum(sd, 0, out=sd), out=sd)
+            if 'Standard_Deviation' in outputs:
+                outputs['Standard_Deviation'][index] = sd
+
+            if 'Standard_Error' in outputs or 'Relative_Uncertainty' in outputs:
+                np.divide(sd, np.sqrt(n), out=sd, where=has_n)
+                sd[~has_n] = 0
+                if 'Standard_Error' in outputs:
+                    outputs['Standard_Error'][index] = sd
+                if 'Relative_Uncertainty' in outputs:
+                    has_mean = mean != 0
+                    np.divide(sd, mean, out=sd, where=has_mean)
+                    sd[~has_mean] = 0
+                    outputs['Relative_Uncertainty'][index] = sd
+
+        slices = list(_iter_slabs(template, chunk_size))
+        _map_chunks(chunk_derive, slices, n_threads)
+        return outputs
+
+    def _dimension_index(self, dim):
+        """Returns the index of a dimension given by name or index."""
+        if isinstance(dim, str):
+            names = [d.name for d in self.dimensions]
+            if dim not in names:
+                raise KeyError('Unknown dimension: "%s"' % dim)
+            return names.index(dim)
+        return int(dim)
+
+    @staticmethod
+    def _check_mask(mask, data):
+        if mask is None:
+            return None
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != data.shape:
+            raise ValueError('Mask shape %s does not match data shape %s' %
+                             (mask.shape, data.shape))
+        return mask
+
     def _read_header(self, header_str):
         """Reads metadata from the header."""
+        quantity, unit, statistics, dimensions = parse_binned_header(header_str)
+        self.dimensions = dimensions
+        if quantity is not None:
+            self.quantity = quantity
+            self.unit = unit
+            self.statistics = statistics
+
 
-        # regular expressions
-        re_float = '[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?'
-        re_uint = '\d+'
-        re_binning = '{d} in (?P<nbins>' + re_uint + ') bin[ s] '
-        re_binning += 'of (?P<binwidth>' + re_float + ') {unit}'
-
-        # map of dimensions and units
-        dim_units = {
-            'X': 'cm',
-            'Y': 'cm',
-            'Z': 'cm',
-            'R': 'cm',
-            'Phi': 'deg',
-            'Theta': 'deg',
-        }
-
-        # retrieve binning info
-        self.dimensions = []
-        for line in header_str.splitlines():
-
-            for dim, unit in dim_units.items():
-                re_tmp = re_binning.format(d=dim, unit=unit)
-                regex = re.compile(re_tmp)
-                match = regex.search(line)
-
-                if match:
-                    N = int(match.group('nbins'))
-                    width = float(match.group('binwidth'))
-                    dimension = BinnedDimension(dim, unit, N, width)
-                    self.dimensions.append(dimension)
-
-        # retrieve scored quantity info
-        re_score_unit = '# (?P<quant>.+) \( (?P<unit>.+) \) : (?P<stats>.+)'
-        re_score_unitless = '# (?P<quant>.+) : (?P<stats>.+)'
-        regex_unit = re.compile(re_score_unit)
-        regex_unitless = re.compile(re_score_unitless)
-
-        for line in header_str.splitlines():
-
-            match = regex_unit.search(line)
-            if match:
-                self.quantity = match.group('quant')
-                self.unit = match.group('unit')
-                self.statistics = match.group('stats').split()
-                break
-
-            match = regex_unitless.search(line)
-            if match:
-                self.quantity = match.group('quant')
-                self.unit = None
-                self.statistics = match.group('stats').split()
-                break
+def _iter_slabs(data, chunk_size, axis=None):
+    """Yields indices of slabs of data containing about chunk_size elements.
+
+    By default, slabs are taken along the slowest-varying axis so that each
+    slab is contiguous in memory (or on disk, for memory-mapped data).
+    """
+    shape = data.shape
+    if not shape:
+        yield ()
+        return
+    if axis is None:
+        strides = [abs(s) if n > 1 else 0 for s, n in zip(data.strides, shape)]
+        axis = int(np.argmax(strides))
+
+    n = shape[axis]
+    slab_size = max(1, int(np.prod(shape)) // max(1, n))
+    step = max(1, chunk_size // slab_size)
+    for start in range(0, n, step):
+        index = [slice(None)] * len(shape)
+        index[axis] = slice(start, min(start+step, n))
+        yield tuple(index)
+
+
+def _select_ranks(chunk_values, chunks, ranks, lo, hi, chunk_size, n_threads=None):
+    """Returns dict of the k-th smallest value for each rank k.
+
+    Args:
+        chunk_values: function returning a 1D array of values given a chunk
+        chunks:       chunks passed to chunk_values
+        ranks:        ranks (0 for the smallest value) to select
+        lo, hi:       smallest and largest value
+        chunk_size:   largest number of values gathered at once
+        n_threads:    number of threads used to process chunks
+
+    Each rank is held in a bracket (lo, hi, n_below) of the values in
+    [lo, hi], of which n_below lie below. Histogramming the values of the
+    bracket narrows it to one bin, and the bin's values are then gathered (if
+    there are at most chunk_size) or its extrema become the next bracket.
+    """
+    selected = {}
+    pending = {k: (lo, hi, 0) for k in ranks}
+    while pending:
+        # find the histogram bin of each bracket holding each rank
+        brackets = sorted(set(pending.values()))
+        edges = {}
+        for b_lo, b_hi, _ in brackets:
+            e = np.linspace(b_lo, b_hi, SELECTION_BINS + 1)[1:-1]
+            e = np.unique(e[e > b_lo])
+            edges[b_lo, b_hi] = e if e.size else np.array([b_hi])
+
+        def chunk_histogram(chunk):
+            values = chunk_values(chunk)
+            counts = []
+            for b_lo, b_hi, _ in brackets:
+                e = edges[b_lo, b_hi]
+                v = values[(values >= b_lo) & (values <= b_hi)]
+                counts.append(np.bincount(np.searchsorted(e, v, side='right'),
+                                          minlength=e.size + 1))
+            return counts
+
+        histograms = [sum(c) for c in zip(*_map_chunks(chunk_histogram, chunks, n_threads))]
+
+        bins = {}
+        for k, (b_lo, b_hi, n_below) in pending.items():
+            i = brackets.index((b_lo, b_hi, n_below))
+            e = edges[b_lo, b_hi]
+            cumulative = n_below + np.cumsum(histograms[i])
+            j = int(np.searchsorted(cumulative, k, side='right'))
+            # bins are [e[j-1], e[j]), except the last which includes b_hi
+            bin_lo = e[j-1] if j else b_lo
+            bin_hi = e[j] if j < e.size else None
+            bin_below = int(cumulative[j-1]) if j else n_below
+            bins[k] = (bin_lo, bin_hi, b_hi, bin_below, int(histograms[i][j]))
+
+        # gather small bins, or narrow the bracket to the extrema of the bin
+        distinct = sorted(set(bins.values()), key=lambda b: b[:2] + (b[3],))
+
+        def chunk_bins(chunk):
+            values = chunk_values(chunk)
+            results = []
+            for bin_lo, bin_hi, b_hi, _, count in distinct:
+                if bin_hi is None:
+                    v = values[(values >= bin_lo) & (values <= b_hi)]
+                else:
+                    v = values[(values >= bin_lo) & (values < bin_hi)]
+                if count <= chunk_size:
+                    results.append(v)
+                else:
+                    results.append((v.min(), v.max()) if v.size else None)
+            return results
+
+        per_chunk = _map_chunks(chunk_bins, chunks, n_threads)
+        for i, (_, _, _, bin_below, count) in enumerate(distinct):
+            parts = [chunk[i] for chunk in per_chunk]
+            for k in [k for k, b in bins.items() if b == distinct[i]]:
+                del pending[k]
+                if count <= chunk_size:
+                    values = np.concatenate(parts)
+                    selected[k] = np.partition(values, k - bin_below)[k - bin_below]
+                    continue
+                extrema = [p for p in parts if p is not None]
+                b_lo = min(p[0] for p in extrema)
+                b_hi = max(p[1] for p in extrema)
+                if b_lo == b_hi:
+                    selected[k] = b_lo
+                else:
+                    pending[k] = (b_lo, b_hi, bin_below)
+    return selected
+
+
+def _map_chunks(func, chunks, n_threads=None):
+    """Applies func to each chunk, optionally using a pool of threads."""
+    if n_threads is None or n_threads <= 1:
+        return [func(chunk) for chunk in chunks]
+    with ThreadPoolExecutor(n_threads) as executor:
+        return list(executor.map(func, chunks))
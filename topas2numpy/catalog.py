@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+# system imports
+import os
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# project imports
+from .header import read_metadata, _ntuple_paths
+from ._compression import split_compression, find_file
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT PRIMARY KEY,
+    header_path TEXT,
+    mtime REAL,
+    kind TEXT,
+    format TEXT,
+    quantity TEXT,
+    unit TEXT,
+    statistics TEXT,
+    columns TEXT,
+    n_records INTEGER
+);
+CREATE TABLE IF NOT EXISTS dimensions (
+    path TEXT REFERENCES results(path) ON DELETE CASCADE,
+    axis INTEGER,
+    name TEXT,
+    unit TEXT,
+    n_bins INTEGER,
+    bin_width REAL
+);
+CREATE TABLE IF NOT EXISTS rejected (
+    path TEXT PRIMARY KEY,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS dimensions_path ON dimensions(path);
+CREATE INDEX IF NOT EXISTS dimensions_binning ON dimensions(name, bin_width);
+CREATE INDEX IF NOT EXISTS results_quantity ON results(quantity);
+"""
+
+_result_fields = [
+    'path', 'header_path', 'mtime', 'kind', 'format', 'quantity', 'unit',
+    'statistics', 'columns', 'n_records',
+]
+
+
+def find_results(root):
+    """Yields (result path, header path) of each TOPAS result below root.
+
+    Each result is yielded once, even if its header exists both compressed
+    and uncompressed (e.g. after gzip -k).
+    """
+    for dirpath, _, filenames in os.walk(root):
+        found = set()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            base, _ = split_compression(path)
+            if base.endswith('.binheader'):
+                paths = find_file(base[:-len('header')]), path
+            elif base.endswith('.header'):
+                paths = _ntuple_paths(path)
+            elif base.endswith('.csv'):
+                paths = path, path
+            else:
+                continue
+            if paths[0] not in found:
+                found.add(paths[0])
+                yield paths
+
+
+def scan_file(path):
+    """Reads the metadata of a result without reading its data.
+
+    Returns:
+        dict of metadata (see topas2numpy.header.read_metadata), or None if
+        path is not a readable TOPAS result
+    """
+    # unreadable or non-TOPAS files are not catalogued
+    try:
+        metadata = read_metadata(path)
+    except Exception:
+        return None
+
+    record = {
+        'quantity': None,
+        'unit': None,
+        'statistics': [],
+        'columns': [],
+    }
+    record.update(metadata)
+    record['dimensions'] = [dict(dim.__dict__) for dim in metadata.get('dimensions', [])]
+    record['mtime'] = _mtime(record['path'], record['header_path'])
+    return record
+
+
+def scan(root, n_threads=None):
+    """Reads the metadata of all results below root, in parallel.
+
+    Returns:
+        list of metadata dicts (see scan_file)
+    """
+    with ThreadPoolExecutor(n_threads) as executor:
+        records = executor.map(lambda paths: scan_file(paths[0]), find_results(root))
+        return [r for r in records if r is not None]
+
+
+class Catalog(object):
+    """SQLite index of the metadata of TOPAS results.
+
+    e.g. all dose scorers with 1 mm binning along Z:
+
+        with Catalog('results.db') as catalog:
+            catalog.refresh('runs/')
+            records = catalog.query(quantity='DoseToMedium',
+                                    dimension='Z', bin_width=0.1)
+    """
+    def __init__(self, db_path):
+        self.path = db_path
+        self._db = sqlite3.connect(db_path)
+        self._db.execute('PRAGMA foreign_keys = ON')
+        self._db.executescript(_schema)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def refresh(self, root, n_threads=None):
+        """Updates the catalog with the results below root.
+
+        Only results whose files were modified since the last refresh are
+        read. Results that no longer exist are removed. Files that are not
+        readable TOPAS results are remembered, and only read again once
+        modified.
+
+        Returns:
+            number of results added or updated, number of results removed
+        """
+        root = os.path.abspath(root)
+        pattern = (_escape_like(os.path.join(root, '')) + '%',)
+        known = dict(self._db.execute(
+            "SELECT path, mtime FROM results WHERE path LIKE ? ESCAPE '\\'", pattern))
+        rejected = dict(self._db.execute(
+            "SELECT path, mtime FROM rejected WHERE path LIKE ? ESCAPE '\\'", pattern))
+
+        found = set()
+        stale = []
+        for path, header_path in find_results(root):
+            found.add(path)
+            mtime = _mtime(path, header_path)
+            if known.get(path, rejected.get(path)) != mtime:
+                stale.append((path, mtime))
+
+        with ThreadPoolExecutor(n_threads) as executor:
+            records = list(executor.map(lambda paths: scan_file(paths[0]), stale))
+
+        removed = [p for p in known if p not in found]
+        with self._db:
+            for path in removed + [p for p in rejected if p not in found] + [p for p, _ in stale]:
+                self._db.execute('DELETE FROM results WHERE path = ?', (path,))
+                self._db.execute('DELETE FROM rejected WHERE path = ?', (path,))
+            for (path, mtime), record in zip(stale, records):
+                if record is not None:
+                    self._insert(record)
+                else:
+                    self._db.execute('INSERT INTO rejected VALUES (?, ?)', (path, mtime))
+
+        n_updated = sum(1 for r in records if r is not None)
+        return n_updated, len(removed)
+
+    def query(self, kind=None, quantity=None, statistic=None, column=None,
+              dimension=None, n_bins=None, bin_width=None, tolerance=1e-9):
+        """Returns metadata dicts of results matching all given criteria.
+
+        Args:
+            kind:      'binned' or 'ntuple'
+            quantity:  name of scored quantity
+            statistic: name of a scored statistic
+            column:    name of an ntuple column
+            dimension: name of a binned dimension, which must also match
+                       n_bins and bin_width (if given)
+            n_bins:    number of bins along dimension
+            bin_width: width of bins along dimension (within tolerance)
+        """
+        sql = 'SELECT DISTINCT results.* FROM results'
+        conditions = []
+        params = []
+        if dimension is not None or n_bins is not None or bin_width is not None:
+            sql += ' JOIN dimensions ON dimensions.path = results.path'
+        if dimension is not None:
+            conditions.append('dimensions.name = ?')
+            params.append(dimension)
+        if n_bins is not None:
+            conditions.append('dimensions.n_bins = ?')
+            params.append(n_bins)
+        if bin_width is not None:
+            conditions.append('ABS(dimensions.bin_width - ?) <= ?')
+            params.extend([bin_width, tolerance])
+        for field, value in (('kind', kind), ('quantity', quantity)):
+            if value is not None:
+                conditions.append('results.%s = ?' % field)
+                params.append(value)
+        for field, value in (('statistics', statistic), ('columns', column)):
+            if value is not None:
+                conditions.append("results.%s LIKE ? ESCAPE '\\'" % field)
+                params.append('%' + _escape_like(json.dumps(value)) + '%')
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY results.path'
+
+        return [self._record(row) for row in self._db.execute(sql, params).fetchall()]
+
+    def _insert(self, record):
+        row = [record[field] for field in _result_fields]
+        row[_result_fields.index('statistics')] = json.dumps(record['statistics'])
+        row[_result_fields.index('columns')] = json.dumps(record['columns'])
+        self._db.execute('INSERT INTO results VALUES (%s)' %
+                         ', '.join('?' * len(row)), row)
+        for axis, dim in enumerate(record['dimensions']):
+            self._db.execute('INSERT INTO dimensions VALUES (?, ?, ?, ?, ?, ?)',
+                             (record['path'], axis, dim['name'], dim['unit'],
+                              dim['n_bins'], dim['bin_width']))
+
+    def _record(self, row):
+        record = dict(zip(_result_fields, row))
+        record['statistics'] = json.loads(record['statistics'])
+        record['columns'] = json.loads(record['columns'])
+        dims = self._db.execute(
+            'SELECT name, unit, n_bins, bin_width FROM dimensions '
+            'WHERE path = ? ORDER BY axis', (record['path'],))
+        record['dimensions'] = [dict(zip(('name', 'unit', 'n_bins', 'bin_width'), d))
+                                for d in dims]
+        return record
+
+
+def _mtime(*paths):
+    """Returns the latest modification time of the existing paths."""
+    return max([os.path.getmtime(p) for p in paths if os.path.exists(p)] or [0])
+
+
+def _escape_like(s):
+    return s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
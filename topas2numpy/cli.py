@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+"""Command-line tool for summarizing and converting TOPAS results.
+
+    topas2numpy info Dose.bin Beam.phsp
+    topas2numpy convert -j 8 -f npz -o out/ runs/*/Dose.bin
+    topas2numpy merge -o Dose.npz run1/Dose.bin run2/Dose.bin
+    topas2numpy stats -j 8 runs/*/Beam.phsp
+"""
+
+# system imports
+import os
+import sys
+import json
+import shutil
+import zipfile
+import argparse
+import tempfile
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+# project imports
+from . import __version__
+from .header import read_metadata
+from ._compression import split_compression
+
+
+# statistics of binned results that can be combined across runs
+merge_functions = {
+    'Sum': 'add',
+    'Count_in_Bin': 'add',
+    'Histories_with_Scorer_Active': 'add',
+    'Min': 'minimum',
+    'Max': 'maximum',
+}
+
+
+def main(argv=None):
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    if not hasattr(args, 'func'):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog='topas2numpy', description='Summarize and convert TOPAS results.')
+    parser.add_argument('--version', action='version', version=__version__)
+    subparsers = parser.add_subparsers()
+
+    def add_command(name, func, help):
+        subparser = subparsers.add_parser(name, help=help, description=help)
+        subparser.add_argument('files', nargs='+', metavar='FILE',
+                               help='binned result (.bin, .csv) or ntuple (.phsp, .header)')
+        subparser.set_defaults(func=func)
+        return subparser
+
+    def add_jobs(subparser):
+        subparser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                               help='number of files processed in parallel')
+
+    p = add_command('info', _info, 'print metadata read from headers')
+    add_jobs(p)
+    p.add_argument('--json', action='store_true', help='print JSON lines')
+
+    p = add_command('convert', _convert, 'convert results to NumPy files')
+    add_jobs(p)
+    p.add_argument('-f', '--format', choices=['npy', 'npz', 'columns'], default='npy',
+                   help='npy: single array (the selected statistic of binned results); '
+                        'npz: one array per statistic or column (ntuple columns are '
+                        'streamed via temporary files next to the output); '
+                        'columns: directory of .npy files, one per statistic or column')
+    p.add_argument('-s', '--statistic', default='Sum',
+                   help='statistic of binned results written to npy (default: Sum)')
+    p.add_argument('-o', '--output-dir', default=None,
+                   help='output directory (default: next to each input)')
+
+    p = add_command('merge', _merge, 'combine results of split runs')
+    p.add_argument('-o', '--output', required=True,
+                   help='output file (.npz for binned results, .npy for ntuples)')
+    add_jobs(p)
+
+    p = add_command('stats', _stats, 'print summary statistics of data')
+    add_jobs(p)
+    p.add_argument('--json', action='store_true', help='print JSON lines')
+    p.add_argument('--chunk-size', type=int, default=2**20,
+                   help='number of values or records read at once')
+
+    return parser
+
+
+def _run_jobs(func, items, jobs):
+    """Yields (item, result or exception) of func for each item, in order.
+
+    At most jobs items are in flight, so that results (e.g. whole grids) are
+    not all held in memory at once.
+    """
+    if jobs <= 1:
+        for item in items:
+            try:
+                yield item, func(item)
+            except Exception as e:
+                yield item, e
+        return
+
+    pending = collections.deque()
+    with ProcessPoolExecutor(jobs) as executor:
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= jobs:
+                yield _job_result(*pending.popleft())
+        while pending:
+            yield _job_result(*pending.popleft())
+
+
+def _job_result(item, future):
+    try:
+        return item, future.result()
+    except Exception as e:
+        return item, e
+
+
+def _report_errors(results):
+    """Prints failures to stderr, returning the successful results and status."""
+    status = 0
+    successes = []
+    for item, result in results:
+        if isinstance(result, Exception):
+            # jobs of some commands are tuples of the input path and options
+            path = item[0] if isinstance(item, tuple) else item
+            sys.stderr.write('topas2numpy: %s: %s\n' % (path, result))
+            status = 1
+        else:
+            successes.append((item, result))
+    return successes, status
+
+
+def _info(args):
+    results, status = _report_errors(_run_jobs(_read_info, args.files, args.jobs))
+    for path, metadata in results:
+        if args.json:
+            print(json.dumps(metadata))
+            continue
+        print(path)
+        for key, value in sorted(metadata.items()):
+            if key == 'dimensions':
+                value = ', '.join('%s: %d x %g %s' % (d['name'], d['n_bins'], d['bin_width'], d['unit'])
+                                  for d in value)
+            elif isinstance(value, list):
+                value = ', '.join(value)
+            print('  %-12s %s' % (key, value))
+    return status
+
+
+def _read_info(path):
+    metadata = read_metadata(path)
+    if 'dimensions' in metadata:
+        metadata['dimensions'] = [dict(d.__dict__) for d in metadata['dimensions']]
+    return metadata
+
+
+def _convert(args):
+    items = [(path, args.format, args.statistic, args.output_dir) for path in args.files]
+    results, status = _report_errors(_run_jobs(_convert_file, items, args.jobs))
+    for (path, _, _, _), output in results:
+        print('%s -> %s' % (path, output))
+    return status
+
+
+def _convert_file(item):
+    import numpy as np
+    path, file_format, statistic, output_dir = item
+
+    stem = _output_stem(path, output_dir)
+    metadata = read_metadata(path)
+
+    if metadata['kind'] == 'binned':
+        from .binned import BinnedResult
+        mmap_mode = 'r' if split_compression(path)[1] is None and metadata['format'] == 'binary' else None
+        result = BinnedResult(path, mmap_mode=mmap_mode)
+        if file_format == 'npy':
+            output = stem + '.npy'
+            np.save(output, result.data[statistic])
+        elif file_format == 'npz':
+            output = stem + '.npz'
+            np.savez(output, **result.data)
+        else:
+            output = stem
+            _makedirs(output)
+            for stat, values in result.data.items():
+                np.save(os.path.join(output, _filename(stat) + '.npy'), values)
+        return output
+
+    if file_format == 'npz':
+        # stream the columns into .npy files, then store them in the archive
+        output = stem + '.npz'
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(output) or '.')
+        try:
+            column_dir = _stream_ntuple(path, metadata['n_records'],
+                                       os.path.join(tmp_dir, 'columns'), 'columns')
+            try:
+                with zipfile.ZipFile(output, 'w', allowZip64=True) as archive:
+                    for name in metadata['columns']:
+                        archive.write(os.path.join(column_dir, _filename(name) + '.npy'),
+                                      arcname=name + '.npy')
+            except Exception:
+                _remove(output)
+                raise
+        finally:
+            shutil.rmtree(tmp_dir)
+        return output
+
+    return _stream_ntuple(path, metadata['n_records'], stem, file_format)
+
+
+def _stream_ntuple(path, n_records, stem, file_format):
+    """Streams an ntuple into a memory-mapped .npy file, or a directory of
+    .npy files (one per column), returning the output path."""
+    import numpy as np
+    from .ntuple import iter_ntuple
+
+    if n_records is None:
+        # unknown length, e.g. compressed ASCII ntuple without a count
+        n_records = sum(len(chunk) for chunk in iter_ntuple(path))
+
+    # stream chunks into memory-mapped outputs
+    output = None
+    outputs = None
+    start = 0
+    try:
+        for chunk in iter_ntuple(path):
+            if outputs is None:
+                if file_format == 'npy':
+                    output = stem + '.npy'
+                    outputs = {None: np.lib.format.open_memmap(
+                        output, mode='w+', dtype=chunk.dtype, shape=(n_records,))}
+                else:
+                    output = stem
+                    _makedirs(output)
+                    outputs = {name: np.lib.format.open_memmap(
+                        os.path.join(output, _filename(name) + '.npy'), mode='w+',
+                        dtype=chunk.dtype[name], shape=(n_records,))
+                        for name in chunk.dtype.names}
+            stop = start + len(chunk)
+            _check_n_records(path, stop, n_records, complete=False)
+            for name, out in outputs.items():
+                out[start:stop] = chunk if name is None else chunk[name]
+            start = stop
+
+        if outputs is None:
+            raise IOError('Empty ntuple: "%s"' % path)
+        _check_n_records(path, start, n_records)
+        for out in outputs.values():
+            out.flush()
+    except Exception:
+        # do not leave incomplete outputs behind
+        outputs = None
+        if output is not None:
+            _remove(output)
+        raise
+    return output
+
+
+def _merge(args):
+    import numpy as np
+    items = args.files
+    metadata, status = _report_errors(_run_jobs(read_metadata, items, args.jobs))
+    if status:
+        return status
+
+    kinds = set(m['kind'] for _, m in metadata)
+    if len(kinds) != 1:
+        sys.stderr.write('topas2numpy: cannot merge binned results with ntuples\n')
+        return 1
+
+    if kinds == {'ntuple'}:
+        try:
+            n_read = _merge_ntuples(items, [m['n_records'] for _, m in metadata], args.output)
+        except Exception as e:
+            sys.stderr.write('topas2numpy: %s\n' % e)
+            return 1
+        print('%d records -> %s' % (n_read, args.output))
+        return 0
+
+    reference = metadata[0][1]
+    for path, m in metadata[1:]:
+        if m['dimensions'] != reference['dimensions'] or m['statistics'] != reference['statistics']:
+            sys.stderr.write('topas2numpy: %s: binning or statistics differ from %s\n' % (path, items[0]))
+            return 1
+
+    stats = [s for s in reference['statistics'] if s in merge_functions]
+    skipped = [s for s in reference['statistics'] if s not in merge_functions]
+    if skipped:
+        sys.stderr.write('topas2numpy: cannot merge statistics: %s\n' % ', '.join(skipped))
+    if not stats:
+        return 1
+
+    # accumulate results as they are loaded
+    total = {}
+    for path, data in _run_jobs(_load_binned, items, args.jobs):
+        if isinstance(data, Exception):
+            sys.stderr.write('topas2numpy: %s: %s\n' % (path, data))
+            return 1
+        for stat in stats:
+            if stat in total:
+                func = getattr(np, merge_functions[stat])
+                func(total[stat], data[stat], out=total[stat])
+            else:
+                total[stat] = np.array(data[stat])
+    np.savez(args.output, **total)
+    print('%d results -> %s' % (len(items), args.output))
+    return 0
+
+
+def _merge_ntuples(paths, n_records, output):
+    """Concatenates ntuples chunk by chunk into a memory-mapped .npy file,
+    returning the number of records."""
+    import numpy as np
+    from .ntuple import iter_ntuple
+
+    if None in n_records:
+        n_records = [sum(len(c) for c in iter_ntuple(path)) for path in paths]
+
+    out = None
+    start = 0
+    try:
+        for path, n in zip(paths, n_records):
+            file_start = start
+            for chunk in iter_ntuple(path):
+                if out is None:
+                    out = np.lib.format.open_memmap(output, mode='w+', dtype=chunk.dtype,
+                                                    shape=(sum(n_records),))
+                elif chunk.dtype != out.dtype:
+                    raise IOError('Columns of "%s" differ from "%s"' % (path, paths[0]))
+                stop = start + len(chunk)
+                _check_n_records(path, stop - file_start, n, complete=False)
+                out[start:stop] = chunk
+                start = stop
+            _check_n_records(path, start - file_start, n)
+
+        if out is None:
+            raise IOError('No records to merge')
+        out.flush()
+    except Exception:
+        # do not leave incomplete outputs behind
+        if out is not None:
+            out = None
+            _remove(output)
+        raise
+    return start
+
+
+def _check_n_records(path, n_read, n_records, complete=True):
+    """Raises IOError if more (or, once complete, fewer) records were read
+    than the header states."""
+    if n_read > n_records:
+        raise IOError('"%s" has more records than its header states (%d)' %
+                      (path, n_records))
+    if complete and n_read < n_records:
+        raise IOError('"%s" has %d records, but its header states %d' %
+                      (path, n_read, n_records))
+
+
+def _load_binned(path):
+    from .binned import BinnedResult
+    return BinnedResult(path).data
+
+
+def _stats(args):
+    items = [(path, args.chunk_size) for path in args.files]
+    results, status = _report_errors(_run_jobs(_summarize_file, items, args.jobs))
+    for (path, _), summaries in results:
+        if args.json:
+            print(json.dumps({'path': path, 'statistics': summaries}))
+            continue
+        print(path)
+        width = max([len(name) for name in summaries] or [0])
+        print('  %-*s %12s %12s %12s %12s %12s' % (width, '', 'count', 'min', 'max', 'mean', 'std'))
+        for name, s in summaries.items():
+            print('  %-*s %12d %12.6g %12.6g %12.6g %12.6g' %
+                  (width, name, s['count'], s['min'], s['max'], s['mean'], s['std']))
+    return status
+
+
+def _summarize_file(item):
+    """Returns summary statistics of each statistic or column, read in chunks."""
+    path, chunk_size = item
+    metadata = read_metadata(path)
+    summaries = {}
+
+    if metadata['kind'] == 'binned':
+        from .binned import BinnedResult, _iter_slabs
+        mmap_mode = 'r' if split_compression(path)[1] is None and metadata['format'] == 'binary' else None
+        result = BinnedResult(path, mmap_mode=mmap_mode)
+        for stat, values in result.data.items():
+            summary = _Summary()
+            for index in _iter_slabs(values, chunk_size):
+                summary.update(values[index])
+            summaries[stat] = summary.to_dict()
+        return summaries
+
+    from .ntuple import iter_ntuple
+    # columns of empty ntuples are reported with a count of 0
+    summaries = {name: _Summary() for name in metadata['columns']}
+    for chunk in iter_ntuple(path, chunk_size):
+        for name in chunk.dtype.names:
+            summaries[name].update(chunk[name])
+    return {name: s.to_dict() for name, s in summaries.items()}
+
+
+class _Summary(object):
+    """Running count, extrema, mean and variance of chunks of values."""
+    def __init__(self):
+        self.count = 0
+        self.min = float('nan')
+        self.max = float('nan')
+        self.mean = 0.
+        self.m2 = 0.
+
+    def update(self, values):
+        import numpy as np
+        values = np.asarray(values, dtype=float)
+        n = values.size
+        if n == 0:
+            return
+        mean = values.mean()
+        m2 = ((values - mean)**2).sum()
+
+        # combine with previous chunks (Chan et al.)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta**2 * self.count * n / total
+        self.count = total
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+
+    def to_dict(self):
+        std = (self.m2 / self.count)**0.5 if self.count else float('nan')
+        return {'count': self.count, 'min': float(self.min), 'max': float(self.max),
+                'mean': float(self.mean) if self.count else float('nan'), 'std': std}
+
+
+def _output_stem(path, output_dir):
+    """Returns the output path of a converted input, without extension."""
+    base, _ = split_compression(path)
+    stem, _ = os.path.splitext(base)
+    if output_dir is not None:
+        _makedirs(output_dir)
+        stem = os.path.join(output_dir, os.path.basename(stem))
+    return stem
+
+
+def _makedirs(path):
+    os.makedirs(path, exist_ok=True)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _filename(name):
+    """Returns a column or statistic name usable as a file name."""
+    return name.replace(os.sep, '_').replace('/', '_')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
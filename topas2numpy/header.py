@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""Reading of result metadata from headers, without importing NumPy."""
+
+# system imports
+import re
+import os.path
+from functools import lru_cache, reduce
+from operator import mul
+
+# project imports
+from ._compression import split_compression, find_file, open_file
+
+
+re_float = r'[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?'
+re_uint = r'\d+'
+re_str = r'[\S+ \t]+'
+
+# map of dimensions and units
+dim_units = {
+    'X': 'cm',
+    'Y': 'cm',
+    'Z': 'cm',
+    'R': 'cm',
+    'Phi': 'deg',
+    'Theta': 'deg',
+}
+
+binary_old_int_columns = [
+    'Particle Type (in PDG Format)',
+    'Run ID',
+    'Event ID',
+    'Track ID',
+    'Parent ID',
+    'Seed Part 1',
+    'Seed Part 2',
+    'Seed Part 3',
+    'Seed Part 4',
+]
+
+limited_col_names = [
+    ('Particle Type (sign from z direction)', 'i1'),
+    ('Energy (MeV) (-ve if new history)', 'f4'),
+    ('Position X (cm)', 'f4'),
+    ('Position Y (cm)', 'f4'),
+    ('Position Z (cm)', 'f4'),
+    ('Direction Cosine X', 'f4'),
+    ('Direction Cosine Y', 'f4'),
+    ('Weight', 'f4'),
+]
+
+
+class BinnedDimension(object):
+    """A dimension in which the geometry component is binned.
+
+    Attributes:
+        name  {X, Y, Z, R, Phi, Theta}
+        unit  {cm, deg}
+        n_bins
+        bin_width
+    """
+    def __init__(self, name, unit, n_bins, bin_width):
+        self.name = name
+        self.unit = unit
+        self.n_bins = n_bins
+        self.bin_width = bin_width
+
+    def get_bin_centers(self):
+        import numpy as np
+        N = self.n_bins
+        w = self.bin_width
+        return np.linspace(0.5*w, (N-0.5)*w, N)
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.__dict__ == other.__dict__
+        return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def read_metadata(filepath):
+    """Reads the metadata of a binned result or ntuple from its header.
+
+    Only the header is read (plus the file size of uncompressed binary
+    ntuples whose header omits the number of records).
+
+    Returns:
+        dict with keys:
+            path, header_path
+            kind:       'binned' or 'ntuple'
+            format:     'binary' or 'ascii'
+            quantity, unit, statistics, dimensions (binned results)
+            columns:    list of column names (ntuples)
+            itemsize:   bytes per record (binary ntuples)
+            n_records:  number of bins or records, or None if unknown
+    """
+    base, _ = split_compression(filepath)
+    _, ext = os.path.splitext(base)
+
+    if ext in ('.bin', '.csv'):
+        header_path = find_file(base + 'header') if ext == '.bin' else filepath
+        quantity, unit, statistics, dimensions = parse_binned_header(
+            read_binned_header_str(filepath))
+        if quantity is None:
+            raise IOError('Not a TOPAS binned result: "%s"' % filepath)
+        return {
+            'path': filepath,
+            'header_path': header_path,
+            'kind': 'binned',
+            'format': 'binary' if ext == '.bin' else 'ascii',
+            'quantity': quantity,
+            'unit': unit,
+            'statistics': statistics,
+            'dimensions': dimensions,
+            'n_records': reduce(mul, [dim.n_bins for dim in dimensions], 1),
+        }
+
+    ntuple_path, header_path = _ntuple_paths(filepath)
+    file_format, col_names = _sniff_format(header_path)
+    metadata = {
+        'path': ntuple_path,
+        'header_path': header_path,
+        'kind': 'ntuple',
+        'format': file_format,
+        'columns': [c if isinstance(c, str) else c[0] for c in col_names],
+        'n_records': _read_n_records(header_path),
+    }
+    if file_format == 'binary':
+        metadata['itemsize'] = sum(int(c[1][1:]) for c in col_names)
+        if (metadata['n_records'] is None and os.path.exists(ntuple_path) and
+                split_compression(ntuple_path)[1] is None):
+            metadata['n_records'] = os.path.getsize(ntuple_path) // metadata['itemsize']
+    return metadata
+
+
+def validate(filepath, value_size=8):
+    """Checks the size of a binary result against its header.
+
+    Only the header and the file size are read, so truncated or mismatched
+    files are rejected without reading their data. Compressed and ASCII files
+    are not checked.
+
+    Args:
+        filepath:   path to the result
+        value_size: bytes per value of binned results (8 for float64)
+
+    Returns:
+        dict of metadata (see read_metadata)
+
+    Raises:
+        IOError if the file size does not match the header
+    """
+    metadata = read_metadata(filepath)
+    if metadata['format'] == 'binary':
+        if metadata['kind'] == 'binned':
+            n_values = len(metadata['statistics']) * metadata['n_records']
+            check_size(metadata['path'], n_values * value_size)
+        else:
+            check_ntuple_size(metadata['path'], metadata['itemsize'],
+                              metadata['n_records'])
+    return metadata
+
+
+def check_size(path, expected_size):
+    """Raises IOError unless an uncompressed file has the expected size."""
+    if split_compression(path)[1] is not None:
+        return
+    size = os.path.getsize(path)
+    if size != expected_size:
+        raise IOError('File "%s" has %d bytes, but header implies %d bytes' %
+                      (path, size, expected_size))
+
+
+def check_ntuple_size(path, itemsize, n_records=None):
+    """Raises IOError unless an uncompressed file holds whole records.
+
+    If n_records is given, the file must hold exactly that many records.
+    """
+    if n_records is not None:
+        check_size(path, n_records * itemsize)
+    elif split_compression(path)[1] is None:
+        size = os.path.getsize(path)
+        if size % itemsize:
+            raise IOError('File "%s" has %d bytes, which is not a whole number '
+                          'of %d-byte records' % (path, size, itemsize))
+
+
+def read_binned_header_str(filepath):
+    """Returns the header of a binned result file."""
+    base, _ = split_compression(filepath)
+    _, ext = os.path.splitext(base)
+    if ext == '.bin':
+        with open_file(find_file(base + 'header')) as f_header:
+            return f_header.read()
+    elif ext == '.csv':
+        # header lines precede the data
+        header_str = ''
+        with open_file(filepath) as f:
+            for line in f:
+                if not line.startswith('#'):
+                    break
+                header_str += line
+        return header_str
+    raise IOError('Unrecognized file format: "%s"' % filepath)
+
+
+def parse_binned_header(header_str):
+    """Parses the header of a binned result.
+
+    Returns:
+        quantity, unit, statistics, dimensions (None if not found)
+    """
+    # retrieve binning info
+    dimensions = []
+    for line in header_str.splitlines():
+
+        for dim, unit, regex in _binning_regexes():
+            match = regex.search(line)
+
+            if match:
+                N = int(match.group('nbins'))
+                width = float(match.group('binwidth'))
+                dimensions.append(BinnedDimension(dim, unit, N, width))
+
+    # retrieve scored quantity info
+    regex_unit, regex_unitless = _score_regexes()
+
+    for line in header_str.splitlines():
+
+        match = regex_unit.search(line)
+        if match:
+            statistics = match.group('stats').split()
+            return match.group('quant'), match.group('unit'), statistics, dimensions
+
+        match = regex_unitless.search(line)
+        if match:
+            statistics = match.group('stats').split()
+            return match.group('quant'), None, statistics, dimensions
+
+    return None, None, None, dimensions
+
+
+@lru_cache()
+def _binning_regexes():
+    re_binning = '{d} in (?P<nbins>' + re_uint + ') bin[ s] '
+    re_binning += 'of (?P<binwidth>' + re_float + ') {unit}'
+    return [(dim, unit, re.compile(re_binning.format(d=dim, unit=unit)))
+            for dim, unit in dim_units.items()]
+
+
+@lru_cache()
+def _score_regexes():
+    re_score_unit = r'# (?P<quant>.+) \( (?P<unit>.+) \) : (?P<stats>.+)'
+    re_score_unitless = r'# (?P<quant>.+) : (?P<stats>.+)'
+    return re.compile(re_score_unit), re.compile(re_score_unitless)
+
+
+@lru_cache()
+def _ntuple_regexes():
+    re_ascii = r'^\s?{u}\s?: (?P<name>{s})'
+    re_binary_old = r'^\s?(?P<startbyte>{u})\s?-\s?(?P<endbyte>{u})\s?: (?P<name>{s})'
+    re_binary_new = r'^(?P<dtype>[bfi]{u}): (?P<name>{s})'
+    re_count = r'^Number of Scored (Particles|Entries): (?P<n>{u})'
+    return [re.compile(r.format(u=re_uint, s=re_str))
+            for r in (re_ascii, re_binary_old, re_binary_new, re_count)]
+
+
+def _ntuple_paths(filepath):
+    """Returns paths of the data and header files of an ntuple.
+
+    Either file may be compressed, e.g. Beam.phsp.gz with Beam.header.
+    """
+    base, _ = split_compression(filepath)
+    root, ext = os.path.splitext(base)
+    if ext == '.phsp' and os.path.exists(filepath):
+        ntuple_path = filepath
+    else:
+        ntuple_path = find_file(root + '.phsp')
+    return ntuple_path, find_file(root + '.header')
+
+
+def _read_n_records(header_path):
+    """Returns the number of records stated in the header, if any."""
+    re_count = _ntuple_regexes()[3]
+    with open_file(header_path) as f:
+        lines = iter(f)
+        for line in lines:
+            match = re_count.search(line)
+            if match:
+                return int(match.group('n'))
+
+            # limited phasespace headers give the value on the next line
+            if line.strip() == '$PARTICLES:':
+                return int(next(lines))
+    return None
+
+
+def _sniff_format(header_path):
+    with open_file(header_path) as f:
+        first_line = f.readline()
+
+    # recognize limited phasespace
+    if '$TITLE:' in first_line:
+        return 'binary', limited_col_names
+
+    read_ascii = 'Columns of data are as follows:'
+    read_binary = 'Byte order of each record is as follows:'
+    re_ascii, re_binary_old, re_binary_new, _ = _ntuple_regexes()
+
+    col_names = []
+    with open_file(header_path) as f:
+        read_activated = False
+        for line in f:
+            if line.strip() in (read_ascii, read_binary):
+                read_activated = True
+                file_format = 'ascii' if read_ascii in line else 'binary'
+                continue
+
+            if read_activated:
+                match_ascii = re_ascii.search(line)
+                match_binary_new = re_binary_new.search(line)
+                match_binary_old = re_binary_old.search(line)
+
+                if match_ascii:
+                    col_names.append(match_ascii.group('name').strip())
+
+                # new-style headers use "f4: Name" format
+                elif match_binary_new:
+                    name = match_binary_new.group('name').strip()
+                    dtype = match_binary_new.group('dtype').strip()
+                    col_names.append((name, dtype))
+
+                # old-style headers use " 0- 3: Name" format
+                elif match_binary_old:
+                    name = match_binary_old.group('name').strip()
+                    b1 = int(match_binary_old.group('startbyte'))
+                    b2 = int(match_binary_old.group('endbyte'))
+                    n_bytes = b2-b1+1
+
+                    dtype = 'f'
+                    if n_bytes == 1:
+                        dtype = 'b'
+                    elif name in binary_old_int_columns:
+                        dtype = 'i'
+                    dtype = dtype + str(n_bytes)
+
+                    col_names.append((name, dtype))
+
+                else:
+                    read_activated = False
+
+    return file_format, col_names
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# system imports
+import os
+import tempfile
+import zipfile
+
+# third-party imports
+import numpy as np
+
+# project imports
+from ._compression import split_compression
+
+
+# suffix of the sidecar file storing the index of a data file
+INDEX_SUFFIX = '.lineidx.npz'
+
+# bytes scanned at once when building an index
+_scan_size = 2**24
+
+
+class LineIndex(object):
+    """Byte offsets of the records (data lines) of an ASCII file.
+
+    Blank lines and lines starting with '#' are not records.
+
+    Attributes:
+        path:   path to the indexed file
+        starts: byte offset of the start of each record
+        ends:   byte offset just past the end of each record
+        mtime:  modification time of the file when indexed
+        size:   size of the file when indexed
+    """
+    def __init__(self, path, starts, ends, mtime, size):
+        self.path = path
+        self.starts = starts
+        self.ends = ends
+        self.mtime = mtime
+        self.size = size
+
+    @property
+    def n_records(self):
+        return len(self.starts)
+
+    def is_current(self):
+        """Returns whether the file is unchanged since it was indexed."""
+        stat = os.stat(self.path)
+        return stat.st_mtime == self.mtime and stat.st_size == self.size
+
+    def byte_range(self, start=0, stop=None):
+        """Returns the byte offsets spanning records [start, stop)."""
+        start, stop, _ = slice(start, stop).indices(self.n_records)
+        if stop <= start:
+            return 0, 0
+        return int(self.starts[start]), int(self.ends[stop-1])
+
+    def read_lines(self, start=0, stop=None):
+        """Returns the lines of records [start, stop), read by seeking."""
+        begin, end = self.byte_range(start, stop)
+        with open(self.path, 'rb') as f:
+            f.seek(begin)
+            return f.read(end - begin).decode().splitlines()
+
+    def split(self, n_parts):
+        """Splits the records into up to n_parts ranges of similar byte size.
+
+        Returns:
+            list of (start, stop) record ranges
+        """
+        if self.n_records == 0:
+            return []
+        targets = np.linspace(self.starts[0], self.ends[-1], n_parts + 1)
+        bounds = np.searchsorted(self.starts, targets[1:-1])
+        bounds = np.unique(np.concatenate(([0], bounds, [self.n_records])))
+        return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def save(self, index_path=None):
+        """Writes the index to a sidecar file (default: path + INDEX_SUFFIX).
+
+        The sidecar is written to a temporary file and then renamed, so other
+        processes never read a partly written sidecar.
+        """
+        if index_path is None:
+            index_path = self.path + INDEX_SUFFIX
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(index_path) or '.',
+            prefix=os.path.basename(index_path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, starts=self.starts, ends=self.ends,
+                         mtime=self.mtime, size=self.size)
+            os.replace(tmp_path, index_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def build_index(path):
+    """Scans an ASCII file for the byte offsets of its records."""
+    if split_compression(path)[1] is not None:
+        raise ValueError('Cannot index compressed file: "%s"' % path)
+
+    stat = os.stat(path)
+    if stat.st_size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return LineIndex(path, empty, empty, stat.st_mtime, stat.st_size)
+
+    content = np.memmap(path, dtype=np.uint8, mode='r')
+    newlines = [np.flatnonzero(content[i:i+_scan_size] == ord('\n')) + i
+                for i in range(0, content.size, _scan_size)]
+    newlines = np.concatenate(newlines).astype(np.int64)
+
+    # each line ends after its newline (or at the end of the file)
+    ends = newlines + 1
+    if ends.size == 0 or ends[-1] != content.size:
+        ends = np.append(ends, content.size)
+    starts = np.concatenate(([0], ends[:-1]))
+
+    # drop blank lines and comments
+    first = content[np.minimum(starts, content.size - 1)]
+    is_record = (first != ord('#')) & (first != ord('\n')) & (first != ord('\r'))
+    del content
+
+    return LineIndex(path, starts[is_record], ends[is_record],
+                     stat.st_mtime, stat.st_size)
+
+
+def load_index(path, build=True, save=True):
+    """Returns the index of an ASCII file, reusing its sidecar if current.
+
+    Args:
+        path:  path to the ASCII file
+        build: if True, build the index when no current sidecar exists
+               (otherwise return None)
+        save:  if True, write a newly built index to its sidecar (ignoring
+               failure, e.g. in a read-only directory)
+    """
+    index_path = path + INDEX_SUFFIX
+    if os.path.exists(index_path):
+        # an unreadable sidecar (e.g. removed or corrupted meanwhile) is rebuilt
+        try:
+            with np.load(index_path) as saved:
+                index = LineIndex(path, saved['starts'], saved['ends'],
+                                  float(saved['mtime']), int(saved['size']))
+        except (zipfile.BadZipFile, EOFError, KeyError, ValueError, IOError):
+            index = None
+        if index is not None and index.is_current():
+            return index
+
+    if not build:
+        return None
+
+    index = build_index(path)
+    if save:
+        try:
+            index.save(index_path)
+        except (IOError, OSError):
+            pass
+    return index
@@ -1,116 +1,152 @@
 # -*- coding: utf-8 -*-
 
 # system imports
-import re
 import os.path
+from itertools import islice
 
 # third-party imports
 import numpy as np
 
-re_uint = '\d+'
-re_str = '[\S+ \t]+'
-
-binary_old_int_columns = [
-    'Particle Type (in PDG Format)',
-    'Run ID',
-    'Event ID',
-    'Track ID',
-    'Parent ID',
-    'Seed Part 1',
-    'Seed Part 2',
-    'Seed Part 3',
-    'Seed Part 4',
-]
-
-limited_col_names = [
-    ('Particle Type (sign from z direction)', np.int8),
-    ('Energy (MeV) (-ve if new history)', 'f'),
-    ('Position X (cm)', 'f'),
-    ('Position Y (cm)', 'f'),
-    ('Position Z (cm)', 'f'),
-    ('Direction Cosine X', 'f'),
-    ('Direction Cosine Y', 'f'),
-    ('Weight', 'f'),
-]
-
-
-def read_ntuple(filepath):
-    root, ext = os.path.splitext(filepath)
-    ntuple_path = root + '.phsp'
-    header_path = root + '.header'
+# project imports
+from ._compression import split_compression, open_file, readinto, read_file_into
+from .index import load_index
+from .header import _ntuple_paths, _read_n_records, _sniff_format, check_ntuple_size
+
+# number of records per chunk yielded by iter_ntuple()
+DEFAULT_CHUNK_SIZE = 2**20
+
+
+def read_ntuple(filepath, start=0, stop=None, byteorder=None):
+    """Reads records [start, stop) of an ntuple into a structured array.
+
+    Reading a subset of an ASCII ntuple seeks using its line index (see
+    topas2numpy.index), which is built on first use.
+
+    Binary files are checked against the number of records in the header
+    before reading. Their byte order is native unless byteorder is given
+    ('<' or '>'), in which case the returned array has a non-native dtype
+    and no bytes are swapped.
+    """
+    ntuple_path, header_path = _ntuple_paths(filepath)
 
     file_format, col_names = _sniff_format(header_path)
 
+    compressed = split_compression(ntuple_path)[1] is not None
+    subset = start != 0 or stop is not None
+    if subset and compressed:
+        raise ValueError('Cannot read subset of compressed file: "%s"' % ntuple_path)
+
     if file_format == 'ascii':
         # preserve column names => cannot be viewed as a np.recarray
         # http://docs.scipy.org/doc/numpy-1.10.1/user/basics.io.genfromtxt.html#validating-names
-        return np.genfromtxt(ntuple_path, names=col_names, deletechars=set(), replace_space='')
+        if subset:
+            lines = load_index(ntuple_path).read_lines(start, stop)
+            if not lines:
+                return np.empty(0, dtype=[(name, float) for name in col_names])
+            data = np.genfromtxt(lines, names=col_names, deletechars=set(), replace_space='')
+            return np.atleast_1d(data)
+        with open_file(ntuple_path) as f:
+            return np.genfromtxt(f, names=col_names, deletechars=set(), replace_space='')
+
+    elif file_format == 'binary':
+        dtype = _ntuple_dtype(col_names, byteorder)
+        n_records = _read_n_records(header_path)
+        check_ntuple_size(ntuple_path, dtype.itemsize, n_records)
+        if subset:
+            n_records = os.path.getsize(ntuple_path) // dtype.itemsize
+            start, stop, _ = slice(start, stop).indices(n_records)
+            return np.fromfile(ntuple_path, dtype=dtype, count=max(0, stop - start),
+                               offset=start * dtype.itemsize)
+        if not compressed:
+            return np.fromfile(ntuple_path, dtype=dtype)
+
+        # decompress directly into an array sized from the header
+        if n_records is None:
+            return _read_unsized(ntuple_path, dtype)
+        data = np.empty(n_records, dtype=dtype)
+        read_file_into(ntuple_path, data, exact=True)
+        return data
+
+    else:
+        raise IOError('Unrecognized file format: "%s"' % filepath)
+
+
+def iter_ntuple(filepath, chunk_size=DEFAULT_CHUNK_SIZE, byteorder=None):
+    """Yields successive chunks of an ntuple, each of up to chunk_size records.
+
+    Each chunk is a structured array with the same dtype as read_ntuple().
+    """
+    ntuple_path, header_path = _ntuple_paths(filepath)
+
+    file_format, col_names = _sniff_format(header_path)
+
+    if file_format == 'ascii':
+        with open_file(ntuple_path) as f:
+            while True:
+                lines = list(islice(f, chunk_size))
+                if not lines:
+                    return
+                chunk = np.genfromtxt(lines, names=col_names, deletechars=set(), replace_space='')
+                yield np.atleast_1d(chunk)
 
     elif file_format == 'binary':
-        return np.fromfile(ntuple_path, dtype=np.dtype(col_names))
+        dtype = _ntuple_dtype(col_names, byteorder)
+        check_ntuple_size(ntuple_path, dtype.itemsize, _read_n_records(header_path))
+        with open_file(ntuple_path, 'rb') as f:
+            while True:
+                chunk = np.empty(chunk_size, dtype=dtype)
+                n_records = readinto(f, chunk) // dtype.itemsize
+                if n_records == 0:
+                    return
+                yield chunk[:n_records]
 
     else:
         raise IOError('Unrecognized file format: "%s"' % filepath)
 
 
-def _sniff_format(header_path):
-    with open(header_path) as f:
-        first_line = f.readline()
-
-    # recognize limited phasespace
-    if '$TITLE:' in first_line:
-        return 'binary', limited_col_names
-
-    read_ascii = 'Columns of data are as follows:'
-    re_ascii = '^\s?{u}\s?: (?P<name>{s})'
-    re_ascii = re.compile(re_ascii.format(u=re_uint, s=re_str))
-
-    read_binary = 'Byte order of each record is as follows:'
-    re_binary_old = '^\s?(?P<startbyte>{u})\s?-\s?(?P<endbyte>{u})\s?: (?P<name>{s})'
-    re_binary_old = re.compile(re_binary_old.format(u=re_uint, s=re_str))
-    re_binary_new = '^(?P<dtype>[bfi]{u}): (?P<name>{s})'
-    re_binary_new = re.compile(re_binary_new.format(u=re_uint, s=re_str))
-
-    col_names = []
-    with open(header_path) as f:
-        read_activated = False
-        for line in f:
-            if line.strip() in (read_ascii, read_binary):
-                read_activated = True
-                file_format = 'ascii' if read_ascii in line else 'binary'
-                continue
-
-            if read_activated:
-                match_ascii = re_ascii.search(line)
-                match_binary_new = re_binary_new.search(line)
-                match_binary_old = re_binary_old.search(line)
-
-                if match_ascii:
-                    col_names.append(match_ascii.group('name').strip())
-
-                # new-style headers use "f4: Name" format
-                elif match_binary_new:
-                    name = match_binary_new.group('name').strip()
-                    dtype = match_binary_new.group('dtype').strip()
-                    col_names.append((name, dtype))
-
-                # old-style headers use " 0- 3: Name" format
-                elif match_binary_old:
-                    name = match_binary_old.group('name').strip()
-                    b1 = int(match_binary_old.group('startbyte'))
-                    b2 = int(match_binary_old.group('endbyte'))
-                    n_bytes = b2-b1+1
-
-                    dtype = 'f'
-                    if n_bytes == 1:
-                        dtype = 'b'
-                    elif name in binary_old_int_columns:
-                        dtype = 'i'
-                    dtype = dtype + str(n_bytes)
-
-                    col_names.append((name, dtype))
-
-                else:
-                    read_activated = False
-
-    return file_format, col_names
+def _read_unsized(path, dtype, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decompresses records of unknown number into a single growing array.
+
+    The array is resized in place (doubling its length) as it fills, so
+    records are not held twice as they would be by concatenating chunks.
+    """
+    data = np.empty(chunk_size, dtype=dtype)
+    n_records = 0
+    with open_file(path, 'rb') as f:
+        while True:
+            n_bytes = readinto(f, data[n_records:])
+            n_records += n_bytes // dtype.itemsize
+            if n_records < len(data):
+                break
+            data.resize(2 * len(data))
+    if n_bytes % dtype.itemsize:
+        raise IOError('Truncated file: "%s"' % path)
+    data.resize(n_records)
+    return data
+
+
+def async_read_ntuple(filepath, byteorder=None):
+    """Coroutine reading an ntuple without blocking the event loop.
+
+    Returns the same structured array as read_ntuple().
+    """
+    from ._aio import run_blocking
+    return run_blocking(read_ntuple, filepath, byteorder=byteorder)
+
+
+def aiter_ntuple(filepath, chunk_size=DEFAULT_CHUNK_SIZE, max_pending=2, byteorder=None):
+    """Asynchronous iterator over the chunks yielded by iter_ntuple().
+
+    Chunks are read without blocking the event loop. At most max_pending
+    chunks are read ahead of the consumer.
+    """
+    from ._aio import iterate_blocking
+    return iterate_blocking(iter_ntuple(filepath, chunk_size, byteorder), max_pending)
+
+
+def _ntuple_dtype(col_names, byteorder=None):
+    """Returns the dtype of binary records, optionally in a given byte order."""
+    dtype = np.dtype(col_names)
+    if byteorder is not None:
+        dtype = dtype.newbyteorder(byteorder)
+    return dtype
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# system imports
+import os
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+# third-party imports
+import numpy as np
+
+# project imports
+from .ntuple import iter_ntuple, _ntuple_dtype, DEFAULT_CHUNK_SIZE
+from .header import _ntuple_paths, _sniff_format, _read_n_records, check_ntuple_size
+from .index import load_index
+from ._compression import split_compression
+
+
+def map_reduce(filepath, chunk_func, combine_func, n_workers=None,
+               chunk_size=DEFAULT_CHUNK_SIZE, byteorder=None):
+    """Reduces an ntuple chunk by chunk across a pool of processes.
+
+    e.g. total weight of protons:
+
+        def proton_weight(chunk):
+            protons = chunk['Particle Type (in PDG Format)'] == 2212
+            return chunk['Weight'][protons].sum()
+
+        map_reduce('Beam.phsp', proton_weight, operator.add)
+
+    Each worker maps its own range of records (a memory-mapped slice of a
+    binary file, or a range of lines of an ASCII file found with its line
+    index), so record data is never pickled between processes. Compressed
+    files cannot be split and are reduced serially in this process.
+
+    Args:
+        filepath:     path to the ntuple
+        chunk_func:   function mapping a structured array of records to a
+                      partial result (must be picklable, i.e. defined at
+                      module level)
+        combine_func: function combining two partial results
+        n_workers:    number of processes (default: number of CPUs); if 1,
+                      chunks are processed in this process
+        chunk_size:   number of records per chunk
+        byteorder:    byte order of binary records (see read_ntuple)
+
+    Returns:
+        partial results of all chunks combined in record order, or None for
+        an empty ntuple
+    """
+    ntuple_path, header_path = _ntuple_paths(filepath)
+    file_format, col_names = _sniff_format(header_path)
+
+    if split_compression(ntuple_path)[1] is not None:
+        results = map(chunk_func, iter_ntuple(filepath, chunk_size, byteorder))
+        return _reduce(combine_func, results)
+
+    if file_format == 'binary':
+        dtype = _ntuple_dtype(col_names, byteorder)
+        check_ntuple_size(ntuple_path, dtype.itemsize, _read_n_records(header_path))
+        n_records = os.path.getsize(ntuple_path) // dtype.itemsize
+        tasks = [(_map_binary, ntuple_path, dtype, start * dtype.itemsize,
+                  min(chunk_size, n_records - start), chunk_func)
+                 for start in range(0, n_records, chunk_size)]
+
+    elif file_format == 'ascii':
+        index = load_index(ntuple_path)
+        tasks = []
+        for start in range(0, index.n_records, chunk_size):
+            begin, end = index.byte_range(start, start + chunk_size)
+            tasks.append((_map_ascii, ntuple_path, col_names, begin,
+                          end - begin, chunk_func))
+
+    else:
+        raise IOError('Unrecognized file format: "%s"' % filepath)
+
+    if n_workers == 1:
+        results = map(_run_task, tasks)
+        return _reduce(combine_func, results)
+
+    with ProcessPoolExecutor(n_workers) as executor:
+        results = executor.map(_run_task, tasks)
+        return _reduce(combine_func, results)
+
+
+def _reduce(combine_func, results):
+    """Combines results in order, returning None if there are none."""
+    results = iter(results)
+    try:
+        total = next(results)
+    except StopIteration:
+        return None
+    return functools.reduce(combine_func, results, total)
+
+
+def _run_task(task):
+    func = task[0]
+    return func(*task[1:])
+
+
+def _map_binary(path, dtype, offset, count, chunk_func):
+    chunk = np.memmap(path, dtype=dtype, mode='r',
+                      offset=offset, shape=(count,))
+    return chunk_func(chunk)
+
+
+def _map_ascii(path, col_names, offset, size, chunk_func):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        lines = f.read(size).decode().splitlines()
+    chunk = np.genfromtxt(lines, names=col_names, deletechars=set(), replace_space='')
+    return chunk_func(np.atleast_1d(chunk))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+# system imports
+import json
+import struct
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+# third-party imports
+import numpy as np
+
+# project imports
+from .binned import BinnedDimension, BinnedResult
+
+
+# arrays in the shared block start on multiples of this many bytes
+ALIGNMENT = 64
+
+# the shared block starts with the byte length of the JSON metadata
+_size_format = '<Q'
+_size_bytes = struct.calcsize(_size_format)
+
+# names of the blocks published by this process
+_published_names = set()
+
+
+class SharedResult(object):
+    """A result published into shared memory.
+
+    Attributes:
+        name:   name of the shared memory block (pass to attach())
+        result: BinnedResult or ntuple structured array viewing the block
+
+    The block cannot be closed while any array viewing it (including views
+    derived from the arrays of result) is still referenced. Results attached
+    with readonly=True (the default) may be shared between threads without
+    locking.
+    """
+    def __init__(self, shm, metadata, data_start, readonly):
+        self._shm = shm
+        self._metadata = metadata
+        self._data_start = data_start
+        self._readonly = readonly
+        self._view_refs = []
+        self.name = shm.name
+        self.result = self._map()
+
+    def close(self):
+        """Releases the views and detaches from the shared memory block.
+
+        Raises:
+            BufferError if arrays viewing the block are still referenced
+            elsewhere, in which case result remains usable
+        """
+        # the views are only in use if they outlive our reference to result
+        result_ref = weakref.ref(self.result) if self.result is not None else None
+        self.result = None
+        self._view_refs = [ref for ref in self._view_refs if ref() is not None]
+        if self._view_refs:
+            result = result_ref() if result_ref is not None else None
+            self.result = result if result is not None else self._map()
+            raise BufferError('Cannot close shared memory block "%s" while '
+                              'arrays viewing it are in use' % self.name)
+        self._shm.close()
+
+    def _map(self):
+        """Returns a result viewing the block, tracking its arrays."""
+        views = _map_arrays(self._shm, self._metadata, self._data_start, self._readonly)
+        self._view_refs.extend(weakref.ref(view) for view in views.values())
+        return _build_result(self._metadata, views)
+
+    def unlink(self):
+        """Requests destruction of the shared memory block.
+
+        Should be called once, by the publishing process, after all other
+        processes have closed the block.
+        """
+        self._shm.unlink()
+        _published_names.discard(self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def publish(result, name=None):
+    """Copies a loaded result into a new shared memory block.
+
+    Args:
+        result: BinnedResult or structured array returned by read_ntuple()
+        name:   name of the shared memory block (default: random)
+
+    Returns:
+        SharedResult viewing a copy of the arrays (result is not modified)
+    """
+    if isinstance(result, BinnedResult):
+        metadata = {
+            'kind': 'binned',
+            'path': result.path,
+            'quantity': result.quantity,
+            'unit': result.unit,
+            'statistics': result.statistics,
+            'dimensions': [dim.__dict__ for dim in result.dimensions],
+        }
+        arrays = [(stat, result.data[stat]) for stat in result.statistics]
+    elif isinstance(result, np.ndarray):
+        metadata = {'kind': 'ntuple'}
+        arrays = [('ntuple', result)]
+    else:
+        raise TypeError('Cannot publish object of type %s' % type(result).__name__)
+
+    offset = 0
+    layout = []
+    for key, arr in arrays:
+        order = 'F' if arr.flags.f_contiguous and not arr.flags.c_contiguous else 'C'
+        layout.append({
+            'key': key,
+            'offset': offset,
+            'dtype': np.lib.format.dtype_to_descr(arr.dtype),
+            'shape': list(arr.shape),
+            'order': order,
+        })
+        offset = _align(offset + arr.nbytes)
+    metadata['arrays'] = layout
+
+    header = json.dumps(metadata).encode('utf-8')
+    data_start = _align(_size_bytes + len(header))
+
+    shm = shared_memory.SharedMemory(name=name, create=True,
+                                     size=max(1, data_start + offset))
+    try:
+        struct.pack_into(_size_format, shm.buf, 0, len(header))
+        shm.buf[_size_bytes:_size_bytes+len(header)] = header
+        views = _map_arrays(shm, metadata, data_start, readonly=False)
+        for key, arr in arrays:
+            views[key][...] = arr
+        del views
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+
+    _published_names.add(shm.name)
+    return SharedResult(shm, metadata, data_start, readonly=False)
+
+
+def attach(name, readonly=True):
+    """Attaches to a result published by another process.
+
+    Args:
+        name:     name of the shared memory block
+        readonly: if True, the returned arrays are not writeable
+
+    Returns:
+        SharedResult holding zero-copy views of the shared arrays
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13, attaching registers the block for destruction
+        # when this process exits, which is the publisher's responsibility;
+        # the publisher's own registration must be kept for unlink()
+        shm = shared_memory.SharedMemory(name=name)
+        if shm.name not in _published_names:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+    header_size, = struct.unpack_from(_size_format, shm.buf, 0)
+    header = bytes(shm.buf[_size_bytes:_size_bytes+header_size])
+    metadata = json.loads(header.decode('utf-8'))
+    data_start = _align(_size_bytes + header_size)
+
+    return SharedResult(shm, metadata, data_start, readonly)
+
+
+def _align(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def _map_arrays(shm, metadata, data_start, readonly):
+    """Returns dict of arrays viewing the shared memory block."""
+    views = {}
+    for info in metadata['arrays']:
+        dtype = np.lib.format.descr_to_dtype(info['dtype'])
+        arr = np.ndarray(info['shape'], dtype=dtype, buffer=shm.buf,
+                         offset=data_start + info['offset'], order=info['order'])
+        if readonly:
+            arr.flags.writeable = False
+        views[info['key']] = arr
+    return views
+
+
+def _build_result(metadata, views):
+    if metadata['kind'] == 'ntuple':
+        return views['ntuple']
+
+    result = BinnedResult.__new__(BinnedResult)
+    result.path = metadata['path']
+    result.quantity = metadata['quantity']
+    result.unit = metadata['unit']
+    result.statistics = metadata['statistics']
+    result.dimensions = [BinnedDimension(**d) for d in metadata['dimensions']]
+    result.data = views
+    return result